@@ -0,0 +1,106 @@
+"""
+Throughput of scripted bulk edits (renames) on an encrypted .2fas file.
+
+Usage:
+    python benchmarks/bench_edits.py [services] [edits]
+
+Compares three ways to apply the same edits:
+- naive: load (key derivation + decryption), edit and save for every single edit
+- reuse key: load once, then edit + save (re-encrypt + atomic write) per edit
+- batched: load once, apply all edits in memory and save once
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pyotp
+
+from twofas.vault import Vault, read_vault_file
+
+PASSPHRASE = "benchmark"
+
+
+def make_file(directory: Path, amount: int) -> str:
+    """
+    Create an encrypted file with random services.
+    """
+    filename = str(directory / "bench.2fas")
+    vault = Vault.create(filename, PASSPHRASE)
+    vault.edit(
+        add=[{"name": f"service {idx}", "secret": pyotp.random_base32(), "updatedAt": 0} for idx in range(amount)]
+    )
+    vault.save()
+    return filename
+
+
+def load(filename: str) -> Vault:
+    """
+    Load the file, deriving the key from the passphrase.
+    """
+    data = read_vault_file(filename)
+    assert data is not None
+    return Vault.unlock(filename, data, PASSPHRASE)
+
+
+def rename(vault: Vault, idx: int) -> None:
+    """
+    One edit: rename a service.
+    """
+    service = vault.lookup(f"service {idx}")[0]
+    entry = vault.entry(service)
+    entry["name"] = f"renamed {idx}"
+    vault.edit(remove=[service], add=[entry])
+
+
+def naive(filename: str, edits: int) -> None:
+    """
+    Every edit on its own, like editing by hand.
+    """
+    for idx in range(edits):
+        vault = load(filename)
+        rename(vault, idx)
+        vault.save()
+
+
+def reuse_key(filename: str, edits: int) -> None:
+    """
+    Load once, but write after every edit.
+    """
+    vault = load(filename)
+    for idx in range(edits):
+        rename(vault, idx)
+        vault.save()
+
+
+def batched(filename: str, edits: int) -> None:
+    """
+    Load once, write once.
+    """
+    vault = load(filename)
+    for idx in range(edits):
+        rename(vault, idx)
+    vault.save()
+
+
+def main() -> None:
+    """
+    Print the edits per second of every approach.
+    """
+    amount = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000
+    edits = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    print(f"{amount} services, {edits} renames:")
+    for approach in (naive, reuse_key, batched):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = make_file(Path(directory), amount)
+            start = time.perf_counter()
+            approach(filename, edits)
+            duration = time.perf_counter() - start
+
+        print(f"{approach.__name__:>10}: {edits / duration:10,.1f} edits/s ({duration:.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark for reading the cli settings: `load_cli_settings` (configuraptor) vs `read_cli_settings` (tomllib).
+
+Usage:
+    python benchmarks/bench_settings.py [repeat]
+
+'first' is the first read in a fresh process (as on startup), 'repeat' is the average of later reads.
+"""
+
+import subprocess  # nosec: B404
+import sys
+import tempfile
+import timeit
+import typing
+from pathlib import Path
+
+from configuraptor import Singleton
+
+from twofas.cli_settings import load_cli_settings, read_cli_settings
+
+EXAMPLE_CONFIG = """
+[tool.2fas]
+files = ["/home/user/a.2fas", "/home/user/b.2fas", "/home/user/c.2fas"]
+default_file = "/home/user/a.2fas"
+auto_verbose = true
+"""
+
+FIRST_READ = """
+import time
+from twofas.cli_settings import {fn}
+start = time.perf_counter()
+{fn}({path!r})
+print(time.perf_counter() - start)
+"""
+
+
+def first_read(fn: str, path: Path) -> float:
+    """
+    Time the first read of the settings in a new interpreter (imports excluded, since those are shared).
+    """
+    output = subprocess.check_output([sys.executable, "-c", FIRST_READ.format(fn=fn, path=str(path))])  # nosec: B603
+    return float(output)
+
+
+def repeated_read(fn: typing.Callable[[Path], typing.Any], path: Path, repeat: int) -> float:
+    """
+    Average time of reading the settings in this (warmed up) process.
+    """
+
+    def run() -> None:
+        Singleton.clear()
+        fn(path)
+
+    return timeit.timeit(run, number=repeat) / repeat
+
+
+def main() -> None:
+    """
+    Print the timings of both ways of reading the settings.
+    """
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000
+
+    with tempfile.NamedTemporaryFile(suffix=".toml") as f:
+        path = Path(f.name)
+        path.write_text(EXAMPLE_CONFIG)
+
+        for fn in (load_cli_settings, read_cli_settings):
+            first = first_read(fn.__name__, path)
+            average = repeated_read(fn, path, repeat)
+            print(f"{fn.__name__:<18} first: {first * 1000:7.3f} ms, repeat: {average * 1000:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
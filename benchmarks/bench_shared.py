@@ -0,0 +1,75 @@
+"""
+Stress benchmark for `SharedStorage.generate` across threads.
+
+Usage:
+    python benchmarks/bench_shared.py [services] [calls-per-thread]
+
+Every thread does the same amount of work, so with linear scaling the throughput grows with the thread count.
+Note: on a CPython build with the GIL, hashing small messages does not release the GIL,
+so only free-threaded builds (3.13t+) can scale; the GIL build shows whether there is contention on top of that.
+"""
+
+import sys
+import threading
+import time
+
+import pyotp
+from lib2fas import TwoFactorAuthDetails
+
+from twofas.shared import SharedStorage
+
+
+def make_storage(amount: int) -> SharedStorage:
+    """
+    Create a storage with random services.
+    """
+    return SharedStorage(
+        TwoFactorAuthDetails.load({"name": f"service {idx}", "secret": pyotp.random_base32(), "updatedAt": 0})
+        for idx in range(amount)
+    )
+
+
+def run(storage: SharedStorage, threads: int, calls: int) -> float:
+    """
+    Let `threads` threads each generate `calls` codes; return the amount of codes per second.
+    """
+    services = list(storage)
+    barrier = threading.Barrier(threads + 1)
+
+    def worker() -> None:
+        barrier.wait()
+        for idx in range(calls):
+            storage.generate(services[idx % len(services)], 1_700_000_000)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+
+    return threads * calls / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """
+    Print the throughput for 1, 2, 4 and 8 threads.
+    """
+    amount = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+
+    storage = make_storage(amount)
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"{amount} services, {calls} calls per thread, GIL enabled: {gil}")
+
+    baseline = None
+    for threads in (1, 2, 4, 8):
+        per_second = run(storage, threads, calls)
+        baseline = baseline or per_second
+        print(f"{threads} thread(s): {per_second:>12,.0f} codes/s ({per_second / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark for `whois`: which of many services generated a code?
+
+Usage:
+    python benchmarks/bench_whois.py [services] [window]
+
+Three cases are measured (the time to load the file is not included):
+- one-shot: `2fas --whois`, which sets up the pre-keyed HMAC of every service (decoding every secret) and looks up once;
+- first lookup in an interactive session, which does the same but keeps the HMACs in the vault (`Vault.totp`);
+- every next lookup in that session, which reuses them and only costs the lookup itself.
+"""
+
+import sys
+import time
+
+import pyotp
+
+from twofas.otp import PrecomputedTotp, whois
+from twofas.vault import Vault
+
+
+def main() -> None:
+    """
+    Print the one-shot, first and repeated lookup times for a vault of random services.
+    """
+    amount = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    window = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    entries = [{"name": f"service {idx}", "secret": pyotp.random_base32(), "updatedAt": 0} for idx in range(amount)]
+    vault = Vault("bench.2fas", entries)
+    services = list(vault.storage)
+    now = time.time()
+    code = services[-1].generate()
+
+    start = time.perf_counter()
+    matches = whois(((service, PrecomputedTotp.from_service(service)) for service in services), code, now, window)
+    one_shot = time.perf_counter() - start
+
+    start = time.perf_counter()
+    whois(((service, vault.totp(service)) for service in services), code, now, window)
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    whois(((service, vault.totp(service)) for service in services), code, now, window)
+    cached = time.perf_counter() - start
+
+    print(
+        f"{amount} services, window {window}: "
+        f"one-shot {one_shot:.3f}s, first in session {first:.3f}s, cached {cached:.3f}s, {len(matches)} match(es)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,5 +3,6 @@ Entrypoint which exposes app.
 """
 
 from .cli import app
+from .shared import SharedStorage
 
-__all__ = ["app"]
+__all__ = ["SharedStorage", "app"]
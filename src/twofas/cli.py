@@ -2,22 +2,27 @@
 This file contains the Typer CLI.
 """
 
+import contextlib
 import os
 import sys
+import time
 import typing
+from dataclasses import dataclass
+from datetime import datetime
 
 import questionary
 import rich
 import typer
 from lib2fas._security import keyring_manager
 from lib2fas._types import TwoFactorAuthDetails
-from lib2fas.core import TwoFactorStorage, load_services
+from rich.table import Table
 
 from .__about__ import __version__
 from .cli_settings import (
     expand_path,
+    expand_paths,
     get_cli_setting,
-    load_cli_settings,
+    read_cli_settings,
     set_cli_setting,
 )
 from .cli_support import (
@@ -27,55 +32,138 @@ from .cli_support import (
     generate_custom_style,
     state,
 )
+from .feed import feed_lines
+from .fingerprint import diff_services, find_duplicates
+from .importer import ImportedLine, add_entries, build_entry, import_services
+from .otp import PrecomputedTotp, codes_between, whois
+from .query_cache import QueryCache
+from .telemetry import PERCENTILES, PHASES, aggregate, read_records, telemetry
+from .vault import (
+    PendingServices,
+    TwoFactorDetailStorage,
+    Vault,
+    load_services_in_background,
+    load_vault,
+    stat_signature,
+)
 
 app = typer.Typer()
 
-TwoFactorDetailStorage: typing.TypeAlias = TwoFactorStorage[TwoFactorAuthDetails]
+
+def ask(question: questionary.Question) -> typing.Any:
+    """
+    Ask the user a question; the time it takes to answer is not counted by the telemetry.
+    """
+    with telemetry.wait():
+        return question.ask()
 
 
 def prepare_to_generate(filename: str = None) -> TwoFactorDetailStorage | None:
     """
     Clear old keyring entries (from previous sessions) and decrypt the selected 2fas file.
+
+    If a `--group` was passed, only the services in that group are returned.
     """
     keyring_manager.cleanup_keyring()
     filepath = filename or default_2fas_file()
-    if not (services := load_services(filepath)):
+    try:
+        vault = load_vault(filepath)
+    except ValueError as e:
+        rich.print(f"[red]Error: {filepath} is not a valid .2fas file ({e})![/red]")
+        return None
+
+    if not vault or not vault.storage:
         rich.print(f"[red]Error: {filepath} does not exit![/red]")
+        return None
+    return select_services(vault)
+
+
+def select_services(vault: Vault) -> TwoFactorDetailStorage | None:
+    """
+    Get the services of a vault, limited to the active `--group` (if any).
+    """
+    if (services := vault.select(state.group)) is None:
+        groups = ", ".join(vault.groups.keys()) or "-"
+        rich.print(f"[red]Error: group '{state.group}' not found in {vault.filename} (groups: {groups})[/red]")
     return services
 
 
-def print_for_service(service: TwoFactorAuthDetails) -> None:
+def print_for_service(service: TwoFactorAuthDetails, code: str = None, vault: Vault = None) -> None:
     """
-    Print the name, current TOTP code and optionally username for a specific service.
+    Print the name, current (or given) TOTP code and optionally username for a specific service.
+
+    If the vault of the service is passed, its cached TOTP generator is used.
     """
     service_name = service.name
-    code = service.generate()
+    with telemetry.phase("generate"):
+        # not service.generate(), which ignores the digits and period of the service:
+        code = code or (vault.totp(service) if vault else PrecomputedTotp.from_service(service)).now()
 
-    if state.verbose and service.otp:
-        username = service.otp.account  # or .label ?
-        rich.print(f"- {service_name} ({username}): {code}")
-    else:
-        rich.print(f"- {service_name}: {code}")
+    with telemetry.phase("render"):
+        if state.verbose and service.otp:
+            username = service.otp.account  # or .label ?
+            rich.print(f"- {service_name} ({username}): {code}")
+        else:
+            rich.print(f"- {service_name}: {code}")
 
 
-def generate_all_totp(services: TwoFactorDetailStorage) -> None:
+def generate_all_totp(services: TwoFactorDetailStorage, vault: Vault = None) -> None:
     """
     Generate TOTP codes for all services.
+
+    If the vault that `services` came from is passed, its cached TOTP generators are (re)used.
     """
     for service in services:
-        print_for_service(service)
+        print_for_service(service, vault=vault)
+
+
+def refresh_vault(vault: Vault | None) -> bool:
+    """
+    Reload the active file if it changed on disk (e.g. synced from the phone) during an interactive session.
 
+    Returns whether anything changed.
+    """
+    if not vault or not (changes := vault.refresh()):
+        return False
+
+    rich.print(
+        f"[blue]Reloaded {vault.filename}:[/blue] "
+        f"{len(changes.added)} added, {len(changes.removed)} removed, {len(changes.changed)} changed"
+    )
+    return True
 
-def generate_one_otp(services: TwoFactorDetailStorage) -> None:
+
+def query_scope(filename: str) -> str:
+    """
+    Scope of the query cache: queries and picks in one file (and group) don't affect the results of another.
+    """
+    return f"{expand_path(filename)}#{state.group or ''}"
+
+
+def generate_one_otp(services: TwoFactorDetailStorage, vault: Vault = None, filename: str = None) -> None:
     """
     Query the user for a service, then generate a TOTP code for it.
+
+    If the vault that `services` came from is passed, they are kept up to date with the file on disk
+    and codes are generated with the vault's cached TOTP generators.
+    The picked services are remembered (for the file of `vault` or `filename`), to show them first in search results.
     """
+    filename = vault.filename if vault else filename
     service_name: str
-    while service_name := questionary.autocomplete(
-        "Choose a service", choices=services.keys(), style=generate_custom_style()
-    ).ask():
-        for service in services.find(service_name):
-            print_for_service(service)
+    while service_name := ask(
+        questionary.autocomplete("Choose a service", choices=services.keys(), style=generate_custom_style())
+    ):
+        if vault and refresh_vault(vault):
+            services = select_services(vault) or services
+        with telemetry.phase("find"):
+            found = list(services.find(service_name))
+        for service in found:
+            print_for_service(service, vault=vault)
+
+        if filename and found:
+            cache = QueryCache.load()
+            cache.record(query_scope(filename), found)
+            cache.save()
 
 
 @clear
@@ -86,72 +174,166 @@ def show_service_info(services: TwoFactorDetailStorage, about: str) -> None:
     rich.print(services[about])
 
 
-def show_service_info_interactive(services: TwoFactorDetailStorage) -> None:
+def show_service_info_interactive(services: TwoFactorDetailStorage, vault: Vault = None) -> None:
     """
     Menu when choosing "Info about a Service".
 
     The raw JSON info for a service as stored in the .2fas file will be printed out.
     """
     about: str
-    while about := questionary.select(
-        "About which service?", choices=services.keys(), style=generate_custom_style()
-    ).ask():
+    while about := ask(
+        questionary.select("About which service?", choices=services.keys(), style=generate_custom_style())
+    ):
+        if vault and refresh_vault(vault):
+            services = select_services(vault) or services
         show_service_info(services, about)
-        if questionary.press_any_key_to_continue("Press 'Enter' to continue; Other keys to exit").ask() is None:
+        if ask(questionary.press_any_key_to_continue("Press 'Enter' to continue; Other keys to exit")) is None:
             exit_with_clear(0)
 
 
-@clear
-def command_interactive(filename: str = None) -> None:
+Screen: typing.TypeAlias = typing.Literal["menu", "settings", "set-default-file", "manage-files", "auto-verbose"]
+
+
+@dataclass
+class InteractiveSession:
+    """
+    State shared by all menus of an interactive session: the active file and its (background loaded) services.
+    """
+
+    filename: str
+    services: PendingServices | None = None
+
+    def load(self) -> PendingServices:
+        """
+        Start loading the active file, unless that already happened earlier in this session.
+        """
+        if self.services is None:
+            self.services = load_services_in_background(self.filename)
+        return self.services
+
+    def open(self, filename: str) -> None:
+        """
+        Switch to another file; its passphrase is asked now and it's decrypted in the background.
+        """
+        self.filename = filename
+        self.services = load_services_in_background(filename)
+
+
+def run_interactive(session: InteractiveSession, screen: Screen | None = "menu") -> None:
+    """
+    Show menus until one of them ends the session.
+
+    Menus return the next menu instead of calling it,
+    so the stack doesn't grow no matter how often the user goes back and forth.
+    """
+    while screen:
+        screen = SCREENS[screen](session)
+
+
+def command_interactive(filename: str = None, services: PendingServices = None) -> None:
     """
     Interactive menu when using 2fas without any action flags.
+
+    The passphrase is asked first, after which the file is decrypted in the background while the menu is shown.
+    """
+    # get from settings or ask:
+    session = InteractiveSession(filename or default_2fas_file(), services)
+    run_interactive(session, "menu")
+
+
+def unavailable_services(vault: Vault | None) -> str | None:
+    """
+    Why there is nothing to generate for a loaded vault (unknown `--group` or no services), after printing the error.
+
+    Returns None if there are services, or if the vault is not loaded yet.
     """
-    if not filename:
-        # get from settings or
-        filename = default_2fas_file()
+    if vault is None:
+        return None
+    if (storage := select_services(vault)) is None:
+        return f"Disabled when group '{state.group}' is not found"
+    if not storage:
+        group = f" (group: {state.group})" if state.group else ""
+        rich.print(f"[red]Error: no services in {vault.filename}{group}[/red]")
+        return "Disabled when there are no services"
+    return None
 
-    if services := prepare_to_generate(filename):
+
+@clear
+def interactive_menu(session: InteractiveSession) -> Screen | None:
+    """
+    Main menu of the interactive session.
+    """
+    filename = session.filename
+    services = session.load()
+
+    reason: str | None = None
+    if services.failed():
+        rich.print(f"[red]Error: {filename} does not exit![/red]")
+        reason = "Disabled when services failed to load"
+    elif reason := unavailable_services(services.ready()):
+        pass  # the error was printed instead
+    elif state.group:
+        rich.print(f"Active file: [blue]{filename}[/blue] (group: [blue]{state.group}[/blue])")
+    else:
         rich.print(f"Active file: [blue]{filename}[/blue]")
 
-    match questionary.select(
-        "What do you want to do?",
-        choices=generate_choices(
-            {
-                "Generate a TOTP code": "generate-one",
-                "Generate all TOTP codes": "generate-all",
-                "Info about a Service": "see-info",
-                "Settings": "settings",
-            },
-            disabled=(
+    action = ask(
+        questionary.select(
+            "What do you want to do?",
+            choices=generate_choices(
                 {
-                    # you may only change settings if loading services failed
-                    "generate-one": "Disabled when services failed to load",
-                    "generate-all": "Disabled when services failed to load",
-                    "see-info": "Disabled when services failed to load",
-                }
-                if services is None
-                else {}
+                    "Generate a TOTP code": "generate-one",
+                    "Generate all TOTP codes": "generate-all",
+                    "Info about a Service": "see-info",
+                    "Settings": "settings",
+                    "Find the service of a code": "whois",
+                },
+                # you may only change settings if there are no services (yet):
+                disabled=dict.fromkeys(("generate-one", "generate-all", "see-info", "whois"), reason) if reason else {},
             ),
-        ),
-        use_shortcuts=True,
-        style=generate_custom_style(),
-    ).ask():
+            use_shortcuts=True,
+            style=generate_custom_style(),
+        )
+    )
+
+    vault = storage = None
+    if action in {"generate-one", "generate-all", "see-info", "whois"}:
+        if not (vault := services.result()):
+            # decrypting failed while the menu was shown; show it again with these options disabled.
+            return "menu"
+
+        refresh_vault(vault)
+        if unavailable_services(vault):
+            # the file finished loading after the menu was shown: keep the error on screen,
+            # after which the menu is drawn again with these options disabled.
+            ask(questionary.press_any_key_to_continue())
+            return "menu"
+        storage = select_services(vault)
+
+    match action:
         case "generate-one":
             # query list of items
-            assert services, "If services is None, this selection branch should be disabled in `generate_choices`."
-            return generate_one_otp(services)
+            assert storage, "If services is None, this selection branch should be disabled in `generate_choices`."
+            generate_one_otp(storage, vault)
         case "generate-all":
             # show all
-            assert services, "If services is None, this selection branch should be disabled in `generate_choices`."
-            return generate_all_totp(services)
+            assert storage, "If services is None, this selection branch should be disabled in `generate_choices`."
+            generate_all_totp(storage, vault)
         case "see-info":
-            assert services, "If services is None, this selection branch should be disabled in `generate_choices`."
-            return show_service_info_interactive(services)
+            assert storage, "If services is None, this selection branch should be disabled in `generate_choices`."
+            show_service_info_interactive(storage, vault)
+        case "whois":
+            assert storage and vault, (
+                "If services is None, this selection branch should be disabled in `generate_choices`."
+            )
+            whois_interactive(storage, vault)
         case "settings":
-            return command_settings(filename)
+            return "settings"
         case _:
             exit_with_clear(0)
 
+    return None
+
 
 def add_2fas_file() -> str:
     """
@@ -159,12 +341,14 @@ def add_2fas_file() -> str:
     """
     settings = state.settings
 
-    filename: str = questionary.path(
-        "Path to .2fas file?",
-        validate=lambda it: it.endswith(".2fas"),
-        # file_filter=lambda it: it.endswith(".2fas"),
-        style=generate_custom_style(),
-    ).ask()
+    filename: str = ask(
+        questionary.path(
+            "Path to .2fas file?",
+            validate=lambda it: it.endswith(".2fas"),
+            # file_filter=lambda it: it.endswith(".2fas"),
+            style=generate_custom_style(),
+        )
+    )
 
     if filename is None:
         return exit_with_clear(0)
@@ -209,18 +393,31 @@ def command_generate(filename: str | None, other_args: list[str]) -> None:
         filename: path to the active .2fas file
         other_args: list of services to generate codes for. If empty, an interactive menu will be shown.
     """
-    if not (storage := prepare_to_generate(filename)):
+    if not other_args:
+        # only .2fas file entered - switch to interactive (which decrypts in the background)
+        return command_interactive(filename)
+
+    filepath = filename or default_2fas_file()
+    # before loading: if the file changes in between, the cached results are simply not used next time.
+    signature = stat_signature(filepath)
+    if not (storage := prepare_to_generate(filepath)):
         # nothing to do
         return
 
     found: list[TwoFactorAuthDetails] = []
 
-    if not other_args:
-        # only .2fas file entered - switch to interactive
-        return command_interactive(filename)
+    # repeated queries (`2fas gh`) are looked up in the query cache instead of fuzzy searching the whole vault,
+    # as long as the file did not change; the services picked most often (in the interactive menu) come first.
+    with telemetry.phase("find"):
+        cache = QueryCache.load()
+        scope = query_scope(filepath)
+        version = [*(signature or ()), len(storage)]
+        for query in other_args:
+            if (results := cache.resolve(scope, query, storage, version)) is None:
+                results = cache.store(scope, query, list(storage.find(query)), version)
+            found.extend(results)
 
-    for query in other_args:
-        found.extend(storage.find(query))
+        cache.save()
 
     for twofa in found:
         print_for_service(twofa)
@@ -254,48 +451,58 @@ def list_settings() -> None:
 
 
 @clear
-def set_default_file_interactive(filename: str) -> None:
+def set_default_file_interactive(session: InteractiveSession) -> Screen:
     """
     Interactive menu (after Settings) to set the default 2fas file.
     """
-    new_filename = questionary.select(
-        "Pick a file:",
-        choices=state.settings.files or [],
-        default=filename,
-        style=generate_custom_style(),
-        use_shortcuts=True,
-    ).ask()
+    new_filename = ask(
+        questionary.select(
+            "Pick a file:",
+            choices=state.settings.files or [],
+            default=session.filename,
+            style=generate_custom_style(),
+            use_shortcuts=True,
+        )
+    )
 
     if new_filename is None:
-        return command_settings(filename)
+        return "settings"
 
     set_setting("default-file", new_filename)
-    prepare_to_generate(new_filename)  # ask for passphrase
+    session.open(new_filename)  # ask for passphrase
 
-    return command_settings(new_filename)
+    return "settings"
 
 
-@clear()
 def command_manage_files(filename: str = None) -> None:
+    """
+    Interactive menu to manage known files (`--remove` without a file).
+
+    If a filename is passed, the settings menu for that file is shown afterwards.
+    """
+    run_interactive(InteractiveSession(filename or ""), "manage-files")
+
+
+@clear()
+def manage_files_interactive(session: InteractiveSession) -> Screen | None:
     """
     Interactive menu (after Settings) to manage known files.
     """
-    to_remove = questionary.checkbox(
-        "Which files do you want to remove?",
-        choices=state.settings.files or [],
-        style=generate_custom_style(),
-    ).ask()
+    to_remove = ask(
+        questionary.checkbox(
+            "Which files do you want to remove?",
+            choices=state.settings.files or [],
+            style=generate_custom_style(),
+        )
+    )
     if to_remove is not None:
         state.settings.remove_file(to_remove)
 
-    if filename:
-        return command_settings(filename)
-
-    return None
+    return "settings" if session.filename else None
 
 
 @clear
-def toggle_autoverbose(filename: str) -> None:
+def toggle_autoverbose(_session: InteractiveSession) -> Screen:
     """
     Interactive menu to manage the 'auto verbose' setting.
     """
@@ -307,63 +514,85 @@ def toggle_autoverbose(filename: str) -> None:
 
     text_enabled = "Enable"
     new_value = (
-        questionary.select(
-            "Use Auto Verbose?",
-            choices=[
-                text_enabled,
-                "Disable",
-            ],
-            style=generate_custom_style(),
-        ).ask()
+        ask(
+            questionary.select(
+                "Use Auto Verbose?",
+                choices=[
+                    text_enabled,
+                    "Disable",
+                ],
+                style=generate_custom_style(),
+            )
+        )
         == text_enabled
     )
 
     settings.auto_verbose = new_value
     state.verbose = new_value
     set_cli_setting("auto_verbose", new_value)
-    return command_settings(filename)
+    return "settings"
 
 
-@clear
 def command_settings(filename: str) -> None:
+    """
+    Settings menu, e.g. when using `-4` to skip the main menu.
+    """
+    run_interactive(InteractiveSession(filename), "settings")
+
+
+@clear
+def settings_interactive(session: InteractiveSession) -> Screen | None:
     """
     Menu that shows up when you've chosen 'Settings' from the interactive menu.
     """
-    rich.print(f"Active file: [blue]{filename}[/blue]")
-    action = questionary.select(
-        "What do you want to do?",
-        choices=generate_choices(
-            {
-                "Show current settings": "show-settings",
-                "Set default file": "set-default-file",
-                "Add file": "add-file",
-                "Remove files": "remove-files",
-                "Toggle auto-verbose": "auto-verbose",
-                "Back": "back",
-            }
-        ),
-        use_shortcuts=True,
-        style=generate_custom_style(),
-    ).ask()
+    rich.print(f"Active file: [blue]{session.filename}[/blue]")
+    action = ask(
+        questionary.select(
+            "What do you want to do?",
+            choices=generate_choices(
+                {
+                    "Show current settings": "show-settings",
+                    "Set default file": "set-default-file",
+                    "Add file": "add-file",
+                    "Remove files": "remove-files",
+                    "Toggle auto-verbose": "auto-verbose",
+                    "Back": "back",
+                }
+            ),
+            use_shortcuts=True,
+            style=generate_custom_style(),
+        )
+    )
 
     match action:
         case "show-settings":
-            return command_setting([])
+            command_setting([])
+            return None
         case "set-default-file":
-            set_default_file_interactive(filename)
+            return "set-default-file"
         case "add-file":
             prepare_to_generate(add_2fas_file())
-            return command_settings(filename)
+            return "settings"
         case "remove-files":
-            return command_manage_files(filename)
+            return "manage-files"
         case "back":
-            return command_interactive(filename)
+            # the services loaded earlier in this session are reused:
+            return "menu"
         case "auto-verbose":
-            return toggle_autoverbose(filename)
+            return "auto-verbose"
         case _:
             exit_with_clear(1)
 
 
+SCREENS: dict[Screen, typing.Callable[[InteractiveSession], Screen | None]] = {
+    "menu": interactive_menu,
+    "settings": settings_interactive,
+    "set-default-file": set_default_file_interactive,
+    "manage-files": manage_files_interactive,
+    "auto-verbose": toggle_autoverbose,
+}
+
+
 def command_setting(args: list[str]) -> None:
     """
     Triggered when using --setting, --settings, -s.
@@ -408,6 +637,392 @@ def command_update() -> None:
         rich.print("[green] 2fas is at the latest version [/green]")
 
 
+def feed_sleep(seconds: float) -> None:
+    """
+    Sleep until the next update of `--feed`, which is not counted by the telemetry.
+    """
+    with telemetry.wait():
+        time.sleep(seconds)
+
+
+def command_feed(filename: str, queries: list[str]) -> None:
+    """
+    `--feed <services...>` prints a line whenever a code (or its countdown) changes, for use in status bars.
+
+    The file is only decrypted once; in between updates the process sleeps.
+    """
+    if not (storage := prepare_to_generate(filename)):
+        exit(1)
+
+    if not queries or not (services := find_services(storage, queries)):
+        rich.print("[red]Err: no services found to feed![/red]", file=sys.stderr)
+        exit(1)
+
+    totps = [(service.name, PrecomputedTotp.from_service(service)) for service in services]
+    try:
+        for line in feed_lines(totps, sleep=feed_sleep):
+            # plain print: status bars don't understand rich's markup
+            print(line, flush=True)
+    except KeyboardInterrupt:
+        return
+
+
+def print_whois(
+    services: typing.Iterable[TwoFactorAuthDetails], code: str, window: int = 1, vault: Vault = None
+) -> bool:
+    """
+    Print which service(s) generated a code, now or up to `window` periods ago (or ahead).
+
+    If the vault of the services is passed, its cached pre-keyed HMACs are used,
+    so only the first lookup in a session pays for setting them up.
+
+    Returns whether any service matched.
+    """
+    with telemetry.phase("find"):
+        totp = vault.totp if vault else PrecomputedTotp.from_service
+        matches = whois(((service, totp(service)) for service in services), code, time.time(), window)
+    if not matches:
+        rich.print(f"[yellow]No service generates {code} (window: {window})[/yellow]")
+        return False
+
+    for service, offset in matches:
+        when = "current code" if not offset else f"{offset:+} period{'s' if abs(offset) > 1 else ''}"
+        rich.print(f"- {describe_service(service)}: {when}")
+    return True
+
+
+def command_whois(filename: str, code: str, window: int = 1) -> None:
+    """
+    `--whois <code>` shows which service(s) generated a code, now or up to `--window` periods ago (or ahead).
+    """
+    if not (storage := prepare_to_generate(filename)):
+        exit(1)
+
+    if not print_whois(storage, code, window):
+        exit(1)
+
+
+def whois_interactive(services: TwoFactorDetailStorage, vault: Vault) -> None:
+    """
+    Menu when choosing "Find the service of a code": look up codes until an empty answer.
+    """
+    code: str
+    while code := ask(questionary.text("Which code?", style=generate_custom_style())):
+        if refresh_vault(vault):
+            services = select_services(vault) or services
+        print_whois(services, code, vault=vault)
+
+
+def parse_timestamp(value: str) -> float:
+    """
+    Convert a unix timestamp or ISO 8601 date(time) to a unix timestamp.
+
+    Dates without a timezone are in local time; a trailing 'Z' means UTC.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    try:
+        return datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value).timestamp()
+    except ValueError:
+        rich.print(f"[red]Err: invalid time '{value}', use a unix timestamp or ISO 8601 date![/red]", file=sys.stderr)
+        exit(1)
+
+
+def find_services(storage: TwoFactorDetailStorage, queries: list[str]) -> list[TwoFactorAuthDetails]:
+    """
+    Find the services for some queries, or all services if there are no queries.
+    """
+    if not queries:
+        return list(storage)
+
+    return [service for query in queries for service in storage.find(query)]
+
+
+def command_at(filename: str, timestamp: str, queries: list[str]) -> None:
+    """
+    `--at <time> [services...]` shows the codes at a specific moment instead of now.
+    """
+    if not (storage := prepare_to_generate(filename)):
+        exit(1)
+
+    for_time = parse_timestamp(timestamp)
+    totps = ((service, PrecomputedTotp.from_service(service)) for service in find_services(storage, queries))
+    for _, service, code in codes_between(totps, for_time, for_time):
+        print_for_service(service, code)
+
+
+def command_range(filename: str, start: str, end: str, queries: list[str]) -> None:
+    """
+    `--range <start> <end> [services...]` prints the code of every time window in a period, one line per code.
+
+    Lines are tab-separated (window start as unix timestamp, service, code) and streamed,
+    so long ranges can be piped to other tools.
+    """
+    if not (storage := prepare_to_generate(filename)):
+        exit(1)
+
+    start_time, end_time = parse_timestamp(start), parse_timestamp(end)
+    if end_time < start_time:
+        rich.print("[red]Err: the end of --range is before the start![/red]", file=sys.stderr)
+        exit(1)
+
+    totps = [(service, PrecomputedTotp.from_service(service)) for service in find_services(storage, queries)]
+    for timestamp, service, code in codes_between(totps, start_time, end_time):
+        # plain print: no markup, so the output can be parsed
+        print(f"{timestamp}\t{describe_service(service)}\t{code}")
+
+
+def open_for_edit(args: list[str], create: bool = False) -> tuple[Vault, list[str]]:
+    """
+    Load the .2fas file in `args` (or the default file) to edit it; the other args are returned as well.
+
+    With `create`, a file that doesn't exist yet is started (after asking for its passphrase).
+    A file that exists but can't be read (e.g. truncated or still syncing) is never edited,
+    since saving would replace all of its services.
+    """
+    targets = [_ for _ in args if _.endswith(".2fas")]
+    if len(targets) > 1:
+        rich.print("[red]Err: can only edit one .2fas file at a time![/red]", file=sys.stderr)
+        exit(1)
+
+    filename = expand_path(targets[0] if targets else default_2fas_file())
+    keyring_manager.cleanup_keyring()
+    try:
+        vault = load_vault(filename)
+    except ValueError as e:
+        rich.print(f"[red]Error: {filename} is not a valid .2fas file ({e})![/red]", file=sys.stderr)
+        exit(1)
+
+    if not vault:
+        if not create:
+            rich.print(f"[red]Error: {filename} does not exit![/red]", file=sys.stderr)
+            exit(1)
+
+        rich.print(f"Creating [blue]{filename}[/blue] (leave the passphrase empty to store the services unencrypted)")
+        with telemetry.wait():
+            passphrase = keyring_manager.save_credentials(filename)
+        vault = Vault.create(filename, passphrase)
+
+    return vault, [_ for _ in args if not _.endswith(".2fas")]
+
+
+def resolve_selector(vault: Vault, selector: str) -> list[TwoFactorAuthDetails]:
+    """
+    Services with exactly this name, or 'name:account' if there are multiple accounts for a service.
+    """
+    if services := vault.lookup(selector):
+        return services
+
+    name, _, account = selector.rpartition(":")
+    return vault.lookup(name, account) if name else []
+
+
+def command_import(args: list[str]) -> None:
+    """
+    `2fas import <input...> [file.2fas]` adds services from otpauth:// URI lists or CSV files ('-' for stdin).
+
+    The target file is created if it doesn't exist yet; all services are written at once when everything is parsed.
+    """
+    # check the inputs before asking for (or creating) the target file:
+    missing = [_ for _ in args if not _.endswith(".2fas") and _ != "-" and not os.path.isfile(expand_path(_))]
+    for source in missing:
+        rich.print(f"[red]{source}: no such file[/red]", file=sys.stderr)
+    if missing:
+        exit(1)
+
+    vault, sources = open_for_edit(args, create=True)
+    filename = vault.filename
+    sources = sources or ["-"]
+
+    added = duplicates = 0
+    for source in sources:
+        with contextlib.nullcontext(sys.stdin) if source == "-" else open(expand_path(source), newline="") as f:
+            result = import_services(vault, f)
+
+        added += len(result.added)
+        duplicates += result.duplicates
+        for line, error in result.errors:
+            rich.print(f"[red]{source}:{line}: {error}[/red]", file=sys.stderr)
+
+    if added:
+        vault.save()
+        state.settings.add_file(filename)
+
+    rich.print(f"Imported {added} service(s) into [blue]{filename}[/blue] ({duplicates} already present)")
+
+
+def command_add(args: list[str]) -> None:
+    """
+    `2fas add <otpauth-uri...> [file.2fas]` or `2fas add <name> <secret> [account] [file.2fas]` adds service(s).
+    """
+    vault, rest = open_for_edit(args, create=True)
+    if rest and all(_.startswith("otpauth://") for _ in rest):
+        result = import_services(vault, rest)
+    elif len(rest) in (2, 3):
+        try:
+            imported = ImportedLine(
+                1, build_entry(name=rest[0], secret=rest[1], account=rest[2] if len(rest) == 3 else "")
+            )
+        except ValueError as e:
+            imported = ImportedLine(1, None, str(e))
+        # same duplicate check as the otpauth:// form:
+        result = add_entries(vault, [imported])
+    else:
+        rich.print("[red]Err: use `2fas add <otpauth-uri...>` or `2fas add <name> <secret> [account]`[/red]")
+        exit(1)
+
+    errors = [error for _, error in result.errors]
+    if result.duplicates:
+        errors.append(f"{result.duplicates} service(s) already present")
+
+    for error in errors:
+        rich.print(f"[red]{error}[/red]", file=sys.stderr)
+
+    if not errors:
+        vault.save()
+        # e.g. a new file, so `dedupe` and the file pickers know about it:
+        state.settings.add_file(vault.filename)
+        rich.print(f"Saved [blue]{vault.filename}[/blue] ({len(vault.storage)} services)")
+    else:
+        exit(1)
+
+
+def command_rm(args: list[str]) -> None:
+    """
+    `2fas rm <service...> [file.2fas]` removes services (by exact name, or 'name:account').
+
+    Nothing is removed if any of the services can't be found (or is ambiguous).
+    """
+    vault, selectors = open_for_edit(args)
+
+    to_remove = []
+    for selector in selectors:
+        if not (services := resolve_selector(vault, selector)):
+            rich.print(f"[red]Err: no service named '{selector}'[/red]", file=sys.stderr)
+            exit(1)
+        if len(services) > 1:
+            accounts = ", ".join(f"{selector}:{_.otp.account if _.otp else ''}" for _ in services)
+            rich.print(f"[red]Err: '{selector}' is ambiguous, use one of: {accounts}[/red]", file=sys.stderr)
+            exit(1)
+        to_remove.extend(services)
+
+    if not to_remove:
+        return
+
+    names = ", ".join(describe_service(_) for _ in to_remove)
+    # ask when used by a person, not when used in a script:
+    if sys.stdin.isatty() and not ask(questionary.confirm(f"Remove {names}?", default=False)):
+        return
+
+    vault.edit(remove=to_remove)
+    vault.save()
+    rich.print(f"Removed {names} from [blue]{vault.filename}[/blue]")
+
+
+def command_rename(args: list[str]) -> None:
+    """
+    `2fas rename <service> <new name> [<service> <new name>...] [file.2fas]` renames services.
+    """
+    vault, rest = open_for_edit(args)
+    if not rest or len(rest) % 2:
+        rich.print("[red]Err: use `2fas rename <service> <new name>`[/red]", file=sys.stderr)
+        exit(1)
+
+    now = int(time.time() * 1000)
+    for selector, new_name in zip(rest[::2], rest[1::2]):
+        services = resolve_selector(vault, selector)
+        if len(services) != 1:
+            rich.print(f"[red]Err: no single service named '{selector}'[/red]", file=sys.stderr)
+            exit(1)
+
+        entry = vault.entry(services[0])
+        entry["name"] = new_name
+        entry["updatedAt"] = now
+        vault.edit(remove=services, add=[entry])
+
+    # all renames are written (and encrypted) at once:
+    vault.save()
+    rich.print(f"Renamed {len(rest) // 2} service(s) in [blue]{vault.filename}[/blue]")
+
+
+def command_stats() -> None:
+    """
+    `--stats` summarizes the recorded telemetry: percentiles of the time spent per command and phase.
+    """
+    if not (stats := aggregate(read_records())):
+        rich.print("No telemetry recorded yet. Enable it with `2fas --setting telemetry true`.")
+        return
+
+    table = Table(title=f"Time per command in ms (p{'/p'.join(map(str, PERCENTILES))})")
+    for column in ("command", "runs", "vault", "total", *PHASES):
+        table.add_column(column, justify="left" if column == "command" else "right")
+
+    for command, summary in stats.items():
+        cells = [
+            "/".join(f"{summary[phase][percent] * 1000:.0f}" for percent in PERCENTILES) if phase in summary else "-"
+            for phase in ("total", *PHASES)
+        ]
+        table.add_row(command, str(summary["count"]), str(summary["vault_size"]), *cells)
+
+    rich.print(table)
+
+
+def describe_service(service: TwoFactorAuthDetails) -> str:
+    """
+    Name of a service, with the username if it's known.
+    """
+    if service.otp and service.otp.account:
+        return f"{service.name} ({service.otp.account})"
+    return service.name
+
+
+def command_diff(files: list[str]) -> None:
+    """
+    `2fas diff a.2fas b.2fas` shows which services were added, removed or changed between two files.
+    """
+    if len(files) != 2:
+        rich.print("[red]Err: diff requires exactly two .2fas files![/red]", file=sys.stderr)
+        exit(1)
+
+    old_file, new_file = expand_paths(files)
+    if (old := prepare_to_generate(old_file)) is None or (new := prepare_to_generate(new_file)) is None:
+        exit(1)
+
+    result = diff_services(old, new)
+    for service in result.added:
+        rich.print(f"[green]+ {describe_service(service)}[/green]")
+    for service in result.removed:
+        rich.print(f"[red]- {describe_service(service)}[/red]")
+    for before, after in result.changed:
+        rich.print(f"[yellow]~ {describe_service(before)} -> {describe_service(after)}[/yellow]")
+    for side, service in result.duplicates:
+        filename = old_file if side == "old" else new_file
+        rich.print(f"[blue]= {describe_service(service)} (duplicate in {filename})[/blue]")
+
+    if not result:
+        rich.print("[green]No differences.[/green]")
+
+
+def command_dedupe(files: list[str]) -> None:
+    """
+    `2fas dedupe [files...]` shows services that occur more than once in the given (or all known) .2fas files.
+    """
+    files = expand_paths(files or state.settings.files or [])
+    collections = {filename: services for filename in files if (services := prepare_to_generate(filename))}
+
+    if not (groups := find_duplicates(collections)):
+        rich.print("[green]No duplicates found.[/green]")
+        return
+
+    for group in groups:
+        rich.print(f"Duplicate of {describe_service(group[0][1])}:")
+        for filename, service in group:
+            rich.print(f"- {describe_service(service)} in [blue]{filename}[/blue]")
+
+
 def print_version() -> None:
     """
     --version prints the currently installed version of this library.
@@ -418,6 +1033,26 @@ def print_version() -> None:
     rich.print("lib2fas version: ", core_version)
 
 
+SUBCOMMANDS = ("diff", "dedupe", "import", "add", "rm", "rename")
+
+
+def command_name(args: list[str], flags: dict[str, bool]) -> str:
+    """
+    Name of the command `main` runs (e.g. 'generate', 'all' or 'import'), for telemetry; never the arguments.
+
+    Args:
+        args: positional arguments
+        flags: flag name -> whether it was used, in the order `main` checks them
+    """
+    if args and args[0] in SUBCOMMANDS:
+        return args[0]
+
+    if flag := next((name for name, used in flags.items() if used), None):
+        return flag
+
+    return "generate" if any(not _.endswith(".2fas") for _ in args) else "interactive"
+
+
 @app.command()
 def main(
     args: list[str] = typer.Argument(None),
@@ -439,10 +1074,33 @@ def main(
     ),
     generate_all: bool = typer.Option(False, "--all", "-a", help="Generate all TOTP codes from the active file."),
     version: bool = typer.Option(False, "--version", help="Show the current version of the 2fas cli tool."),
+    stats: bool = typer.Option(
+        False, "--stats", help="Summarize the recorded telemetry (enable with `--setting telemetry true`)."
+    ),
+    feed: bool = typer.Option(
+        False,
+        "--feed",
+        help="`--feed <services...>` keep running and print a line whenever a code changes (e.g. for status bars).",
+    ),
+    whois_code: str = typer.Option(
+        None, "--whois", help="`--whois <code>` show which service(s) a (recent) TOTP code belongs to."
+    ),
+    at: str = typer.Option(
+        None, "--at", help="`--at <time> [services...]` show the codes at a unix timestamp or ISO 8601 date(time)."
+    ),
+    time_range: tuple[str, str] = typer.Option(
+        (None, None),
+        "--range",
+        help="`--range <start> <end> [services...]` print the code of every time window between two times.",
+    ),
     remove: bool = typer.Option(
         False, "--remove", "--rm", "-r", help="`--remove <filename>` to remove a .2fas file from the known files"
     ),
     # flags:
+    window: int = typer.Option(1, "--window", help="How many periods before/after now `--whois` also checks."),
+    group: str = typer.Option(
+        None, "--group", "-g", help="`--group <name>` only use the services in this group (folder) of your .2fas file."
+    ),
     verbose: bool = typer.Option(
         False,
         "--verbose",
@@ -467,10 +1125,34 @@ def main(
 
     2fas <subcommand>
 
+    2fas diff a.2fas b.2fas
+
+    2fas dedupe [files...]
+
+    2fas import <uris.txt | accounts.csv | -> [file.2fas]
+
+    2fas add <otpauth-uri...> | <name> <secret> [account]
+
+    2fas rm <service...>
+
+    2fas rename <service> <new name>
+
     2fas --setting key value
 
     2fas --setting key=value
 
+    2fas --feed <service1> <service2>
+
+    2fas --all --group <name>
+
+    2fas --whois <code> [--window N]
+
+    2fas --at <time> [services...]
+
+    2fas --range <start> <end> [services...]
+
+    2fas --stats
+
     Skip the interactive menu:
     2fas -1 (or -2, -3, -4)
     """
@@ -479,13 +1161,43 @@ def main(
         return print_version()
     elif self_update:
         return command_update()
+    elif stats:
+        return command_stats()
 
     args = args or []
 
     # stateful:
 
-    settings = load_cli_settings()
-    state.update(verbose=settings.auto_verbose or verbose, settings=settings)
+    settings = read_cli_settings()
+    state.update(verbose=settings.auto_verbose or verbose, settings=settings, group=group)
+
+    flags = {
+        "menu": any((step_one, step_two, step_three, step_four)),
+        "setting": setting,
+        "remove": remove,
+        "info": bool(info),
+        "feed": feed,
+        "whois": bool(whois_code),
+        "at": bool(at),
+        "range": time_range[0] is not None,
+        "all": generate_all,
+    }
+    telemetry.start(command_name(args, flags), enabled=settings.telemetry)
+
+    # subcommands (may work on multiple .2fas files):
+    match args:
+        case ["diff", *files]:
+            return command_diff(files)
+        case ["dedupe", *files]:
+            return command_dedupe(files)
+        case ["import", *sources]:
+            return command_import(sources)
+        case ["add", *rest]:
+            return command_add(rest)
+        case ["rm", *rest]:
+            return command_rm(rest)
+        case ["rename", *rest]:
+            return command_rename(rest)
 
     file_args = [_ for _ in args if _.endswith(".2fas")]
     if len(file_args) > 1:
@@ -503,7 +1215,7 @@ def main(
             print("Can not shortcut menu it there are no services.", file=sys.stderr)
             return None
         if step_one:
-            generate_one_otp(services)
+            generate_one_otp(services, filename=filename)
         if step_two:
             generate_all_totp(services)
         if step_three:
@@ -521,6 +1233,14 @@ def main(
     elif info:
         if services := prepare_to_generate(filename):
             show_service_info(services, about=info)
+    elif feed:
+        command_feed(filename, other_args)
+    elif whois_code:
+        command_whois(filename, whois_code, window)
+    elif at:
+        command_at(filename, at, other_args)
+    elif time_range[0] is not None:
+        command_range(filename, *time_range, other_args)
     elif generate_all:
         if services := prepare_to_generate(filename):
             generate_all_totp(services)
@@ -2,6 +2,7 @@
 This file deals with managing settings for 2fas.
 """
 
+import sys
 import typing
 from pathlib import Path
 from typing import Any
@@ -10,6 +11,11 @@ import tomli_w
 from configuraptor import TypedConfig, asdict, beautify, singleton
 from configuraptor.core import convert_key
 
+if sys.version_info >= (3, 11):  # pragma: no cover
+    import tomllib
+else:  # pragma: no cover
+    import tomli as tomllib
+
 config = Path("~/.config").expanduser()
 config.mkdir(exist_ok=True)
 DEFAULT_SETTINGS = config / "2fas.toml"
@@ -44,6 +50,7 @@ class CliSettings(TypedConfig, singleton.Singleton):
     files: list[str] | None
     default_file: str | None
     auto_verbose: bool = False
+    telemetry: bool = False
 
     def add_file(self, filename: str | None, _config_file: str | Path = DEFAULT_SETTINGS) -> str | None:
         """
@@ -90,12 +97,41 @@ def load_cli_settings(input_file: str | Path = DEFAULT_SETTINGS, **overwrite: An
     return CliSettings.load([input_file, overwrite], strict=False, key=CONFIG_KEY)
 
 
+def read_cli_settings(input_file: str | Path = DEFAULT_SETTINGS) -> CliSettings:
+    """
+    Read the config file into a CliSettings instance, without configuraptor's loading and type conversion.
+
+    This is the fast path for reading settings (e.g. on every startup);
+    `load_cli_settings` is still used when settings are written, since it validates the data.
+    """
+    try:
+        data = tomllib.loads(Path(input_file).read_text())
+    except FileNotFoundError:
+        data = {}
+    except tomllib.TOMLDecodeError:
+        return load_cli_settings(input_file)
+
+    section = data.get("tool", {}).get("2fas", {})
+    if "${" in str(section):
+        # configuraptor resolves environment variables in values, so let it deal with those.
+        return load_cli_settings(input_file)
+
+    settings = CliSettings()
+    settings.__dict__.update(
+        files=section.get("files"),
+        default_file=section.get("default_file"),
+        auto_verbose=section.get("auto_verbose", False),
+        telemetry=section.get("telemetry", False),
+    )
+    return settings
+
+
 def get_cli_setting(key: str, filename: str | Path = DEFAULT_SETTINGS) -> typing.Any:
     """
     Get a setting from the config file.
     """
     key = convert_key(key)
-    settings = load_cli_settings(filename)
+    settings = read_cli_settings(filename)
     return getattr(settings, key)
 
 
@@ -20,6 +20,7 @@ class AppState(configuraptor.TypedConfig, configuraptor.Singleton):
     """
 
     verbose: bool = False
+    group: str | None = None
     settings: CliSettings = postpone()
 
 
@@ -0,0 +1,73 @@
+"""
+This file contains the `--feed` mode, which streams codes for status bars (tmux, i3, ...).
+
+Instead of polling, the feed sleeps until the next moment something visible changes:
+a new code (period boundary) or the countdown dropping into the next bucket.
+"""
+
+import math
+import time
+import typing
+
+from .otp import PrecomputedTotp
+
+DEFAULT_BUCKET = 5  # seconds
+
+
+def render_feed(totps: typing.Sequence[tuple[str, PrecomputedTotp]], now: float, bucket: int = DEFAULT_BUCKET) -> str:
+    """
+    One compact line with the code (and countdown, rounded up to `bucket` seconds) of every service.
+    """
+    parts = []
+    for name, totp in totps:
+        code = totp.at(now)
+        if bucket:
+            remaining = totp.interval - (now % totp.interval)
+            parts.append(f"{name} {code} {math.ceil(remaining / bucket) * bucket}s")
+        else:
+            parts.append(f"{name} {code}")
+
+    return " | ".join(parts)
+
+
+def next_change(totps: typing.Sequence[tuple[str, PrecomputedTotp]], now: float, bucket: int = DEFAULT_BUCKET) -> float:
+    """
+    Timestamp of the next period boundary or countdown bucket tick of any service.
+    """
+    changes = []
+    for _, totp in totps:
+        remaining = totp.interval - (now % totp.interval)
+        if bucket:
+            # the shown countdown (see `render_feed`) changes when `remaining` reaches the next lower multiple:
+            remaining -= (math.ceil(remaining / bucket) - 1) * bucket
+        changes.append(now + remaining)
+
+    return min(changes)
+
+
+def feed_lines(
+    totps: typing.Sequence[tuple[str, PrecomputedTotp]],
+    bucket: int = DEFAULT_BUCKET,
+    clock: typing.Callable[[], float] = time.time,
+    sleep: typing.Callable[[float], typing.Any] = time.sleep,
+) -> typing.Generator[str, None, None]:
+    """
+    Endlessly yield a new line whenever it would look different from the previous one.
+
+    Args:
+        totps: (label, generator) pairs to show.
+        bucket: granularity of the countdown in seconds (0 to only show codes).
+        clock: current unix time (can be replaced in tests).
+        sleep: how to wait (can be replaced in tests).
+    """
+    if not totps:
+        return
+
+    previous = None
+    while True:
+        now = clock()
+        if (line := render_feed(totps, now, bucket)) != previous:
+            previous = line
+            yield line
+
+        sleep(max(next_change(totps, now, bucket) - clock(), 0))
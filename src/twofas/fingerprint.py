@@ -0,0 +1,160 @@
+"""
+This file deals with comparing services between (or within) .2fas files.
+
+Every service is reduced to a fingerprint (issuer, account and a hash of its secret),
+which can be used as a dict key so comparisons are done in one linear pass.
+"""
+
+import hashlib
+import typing
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+
+from lib2fas import TwoFactorAuthDetails
+
+Service: typing.TypeAlias = TwoFactorAuthDetails
+Side: typing.TypeAlias = typing.Literal["old", "new"]
+
+
+def normalize_secret(secret: str) -> str:
+    """
+    Base32 secrets are case-insensitive and may contain spaces or padding, which should not make a difference.
+    """
+    return secret.replace(" ", "").rstrip("=").upper()
+
+
+def hash_secret(secret: str) -> str:
+    """
+    Hash a (normalized) secret so it can be compared without keeping it around.
+    """
+    return hashlib.sha256(normalize_secret(secret).encode()).hexdigest()
+
+
+class Fingerprint(typing.NamedTuple):
+    """
+    Hashable summary of a service, which does not contain its secret.
+    """
+
+    issuer: str
+    account: str
+    secret_hash: str
+
+    @property
+    def identity(self) -> tuple[str, str]:
+        """
+        Which account is this about (regardless of its secret)?
+        """
+        return self.issuer, self.account
+
+
+def fingerprint(service: Service) -> Fingerprint:
+    """
+    Create a fingerprint for a service.
+
+    In 2fas, the service name is what other apps call the 'issuer'.
+    """
+    account = (service.otp.account if service.otp else None) or ""
+    return Fingerprint(
+        issuer=(service.name or "").strip().lower(),
+        account=account.strip().lower(),
+        secret_hash=hash_secret(service.secret),
+    )
+
+
+def fingerprint_entry(entry: dict[str, typing.Any]) -> Fingerprint:
+    """
+    Same as `fingerprint`, for a raw entry (as stored in a .2fas file) that was not parsed into a service yet.
+    """
+    account = (entry.get("otp") or {}).get("account") or ""
+    return Fingerprint(
+        issuer=(entry.get("name") or "").strip().lower(),
+        account=account.strip().lower(),
+        secret_hash=hash_secret(entry.get("secret") or ""),
+    )
+
+
+@dataclass
+class VaultDiff:
+    """
+    Result of `diff_services`.
+    """
+
+    added: list[Service] = field(default_factory=list)
+    removed: list[Service] = field(default_factory=list)
+    changed: list[tuple[Service, Service]] = field(default_factory=list)  # (old, new)
+    duplicates: list[tuple[Side, Service]] = field(default_factory=list)  # (collection it occurs in, service)
+
+    def __bool__(self) -> bool:
+        """
+        A diff is truthy if there are any differences.
+        """
+        return bool(self.added or self.removed or self.changed or self.duplicates)
+
+
+def diff_services(old: typing.Iterable[Service], new: typing.Iterable[Service]) -> VaultDiff:
+    """
+    Compare two collections of services by their fingerprint.
+
+    - added: identity only in `new`
+    - removed: identity only in `old`
+    - changed: identity in both, but with a different secret
+    - duplicates: services with the same secret as an earlier service in the same collection
+    """
+    result = VaultDiff()
+
+    # identity -> secret hash -> services in `old` that have not been matched yet.
+    # Indexing by the full fingerprint keeps matching linear, even if many services share an identity.
+    unmatched: defaultdict[tuple[str, str], dict[str, deque[Service]]] = defaultdict(dict)
+    seen_old: set[str] = set()
+    for service in old:
+        fp = fingerprint(service)
+        if fp.secret_hash in seen_old:
+            result.duplicates.append(("old", service))
+        seen_old.add(fp.secret_hash)
+        unmatched[fp.identity].setdefault(fp.secret_hash, deque()).append(service)
+
+    seen_new: set[str] = set()
+    for service in new:
+        fp = fingerprint(service)
+        if fp.secret_hash in seen_new:
+            result.duplicates.append(("new", service))
+        seen_new.add(fp.secret_hash)
+
+        if not (candidates := unmatched.get(fp.identity)):
+            result.added.append(service)
+            continue
+
+        # prefer an exact match, so repeated identities don't show up as changed:
+        secret_hash = fp.secret_hash if fp.secret_hash in candidates else next(iter(candidates))
+        match = candidates[secret_hash].popleft()
+        if not candidates[secret_hash]:
+            del candidates[secret_hash]
+        if not candidates:
+            del unmatched[fp.identity]
+        if secret_hash != fp.secret_hash:
+            result.changed.append((match, service))
+
+    result.removed.extend(
+        service for candidates in unmatched.values() for services in candidates.values() for service in services
+    )
+    return result
+
+
+def find_duplicates(
+    collections: typing.Mapping[str, typing.Iterable[Service]],
+) -> list[list[tuple[str, Service]]]:
+    """
+    Find services that share a secret, within and across collections (e.g. multiple .2fas files).
+
+    Args:
+        collections: mapping of a label (e.g. filename) to the services it contains.
+
+    Returns:
+        groups of (label, service) pairs; only groups with more than one entry are included.
+    """
+    index: defaultdict[str, list[tuple[str, Service]]] = defaultdict(list)
+    for label, services in collections.items():
+        for service in services:
+            index[hash_secret(service.secret)].append((label, service))
+
+    return [group for group in index.values() if len(group) > 1]
@@ -0,0 +1,69 @@
+"""
+This file deals with the groups (folders) of a .2fas file.
+"""
+
+import typing
+
+from lib2fas import TwoFactorAuthDetails
+from lib2fas._types import AnyDict
+
+Service: typing.TypeAlias = TwoFactorAuthDetails
+
+
+class GroupIndex:
+    """
+    Services per group, so a group can be selected without going through the whole vault.
+
+    Groups are stored at the top level of a .2fas file (id + name); services refer to them via 'groupId'.
+    """
+
+    names: dict[str, str]  # group id -> name
+    _members: dict[str | None, dict[int, Service]]  # group id -> id(service) -> service (dict keeps the order)
+
+    def __init__(self, groups: list[AnyDict] | None = None) -> None:
+        """
+        Create an empty index for the groups of a file.
+        """
+        self.names = {}
+        self._members = {}
+        self.set_groups(groups or [])
+
+    def set_groups(self, groups: list[AnyDict]) -> None:
+        """
+        (Re)load the group definitions, e.g. after the file changed.
+        """
+        self.names = {group["id"]: group.get("name") or group["id"] for group in groups if group.get("id")}
+
+    def add(self, services: typing.Iterable[Service]) -> None:
+        """
+        Index new services.
+        """
+        for service in services:
+            self._members.setdefault(service.groupId, {})[id(service)] = service
+
+    def discard(self, services: typing.Iterable[Service]) -> None:
+        """
+        Remove services from the index.
+        """
+        for service in services:
+            if (members := self._members.get(service.groupId)) is not None:
+                members.pop(id(service), None)
+
+    def keys(self) -> list[str]:
+        """
+        Names of the groups of this file.
+        """
+        return list(self.names.values())
+
+    def find(self, name: str) -> list[Service] | None:
+        """
+        Get the services in a group (by name or id, case-insensitive), or None if there is no such group.
+        """
+        name = name.lower()
+        group_ids = [
+            group_id for group_id, group_name in self.names.items() if name in (group_name.lower(), group_id.lower())
+        ]
+        if not group_ids:
+            return None
+
+        return [service for group_id in group_ids for service in self._members.get(group_id, {}).values()]
@@ -0,0 +1,238 @@
+"""
+This file deals with importing services from otpauth:// URIs or CSV into a .2fas file (`2fas import`).
+
+The input is parsed line by line, so large exports don't have to be read into memory at once.
+"""
+
+import csv
+import itertools
+import time
+import typing
+from dataclasses import dataclass, field
+from urllib.parse import parse_qs, unquote, urlparse
+
+from lib2fas import TwoFactorAuthDetails
+from lib2fas._types import AnyDict
+
+from .fingerprint import fingerprint, fingerprint_entry, normalize_secret
+from .otp import decode_secret
+from .vault import Vault
+
+T = typing.TypeVar("T")
+
+# lib2fas doesn't keep the algorithm of a service (codes are always generated with SHA1),
+# so importing anything else would silently result in wrong codes:
+ALGORITHMS = ("SHA1",)
+CSV_ALIASES = {
+    # column name -> field
+    "name": "name",
+    "issuer": "name",
+    "service": "name",
+    "account": "account",
+    "username": "account",
+    "user": "account",
+    "secret": "secret",
+    "digits": "digits",
+    "period": "period",
+    "interval": "period",
+    "algorithm": "algorithm",
+}
+
+
+class ImportedLine(typing.NamedTuple):
+    """
+    Result of parsing one line of the input: either a raw 2fas entry or the reason it was skipped.
+    """
+
+    line: int
+    entry: AnyDict | None
+    error: str | None = None
+
+
+@dataclass
+class ImportResult:
+    """
+    What `import_services` did.
+    """
+
+    added: list[TwoFactorAuthDetails] = field(default_factory=list)
+    duplicates: int = 0
+    errors: list[tuple[int, str]] = field(default_factory=list)  # (line number, reason)
+
+
+def build_entry(
+    name: str,
+    secret: str,
+    account: str = "",
+    digits: int = 6,
+    period: int = 30,
+    algorithm: str = "SHA1",
+    link: str | None = None,
+) -> AnyDict:
+    """
+    Validate the fields of a TOTP service and turn them into an entry as the 2fas apps store it.
+
+    Raises:
+        ValueError: if the secret or one of the parameters is invalid.
+    """
+    secret = normalize_secret(secret)
+    if not secret:
+        raise ValueError("missing secret")
+    try:
+        decode_secret(secret)
+    except ValueError as e:  # binascii.Error is a ValueError
+        raise ValueError(f"invalid secret ({e})") from e
+
+    algorithm = algorithm.upper()
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"unsupported algorithm '{algorithm}' (only {', '.join(ALGORITHMS)} is supported)")
+    if not 6 <= digits <= 10:
+        raise ValueError(f"unsupported amount of digits '{digits}'")
+    if period <= 0:
+        raise ValueError(f"invalid period '{period}'")
+
+    name = name.strip() or account.strip()
+    if not name:
+        raise ValueError("missing name")
+
+    otp: AnyDict = {
+        "account": account.strip() or None,
+        "digits": digits,
+        "period": period,
+        "algorithm": algorithm,
+        "tokenType": "TOTP",
+        "source": "Link" if link else "Manual",
+    }
+    if link:
+        otp["link"] = link
+
+    return {
+        "name": name,
+        "secret": secret,
+        "updatedAt": int(time.time() * 1000),
+        "otp": {key: value for key, value in otp.items() if value is not None},
+    }
+
+
+def parse_otpauth(uri: str) -> AnyDict:
+    """
+    Parse an otpauth:// URI (as in a QR code), e.g. otpauth://totp/Issuer:account?secret=...&issuer=Issuer.
+
+    Raises:
+        ValueError: if it's not a valid TOTP URI.
+    """
+    parsed = urlparse(uri.strip())
+    if parsed.scheme != "otpauth" or parsed.netloc.lower() != "totp":
+        raise ValueError("not an otpauth://totp/ URI")
+
+    query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+    label = unquote(parsed.path.lstrip("/"))
+    label_issuer, _, account = label.rpartition(":")
+
+    return build_entry(
+        name=query.get("issuer") or label_issuer,
+        account=account,
+        secret=query.get("secret", ""),
+        digits=int(query.get("digits") or 6),
+        period=int(query.get("period") or 30),
+        algorithm=query.get("algorithm") or "SHA1",
+        link=uri.strip(),
+    )
+
+
+def parse_csv_row(row: dict[str | None, str | None]) -> AnyDict:
+    """
+    Parse a CSV row (with at least the columns 'name' and 'secret', see `CSV_ALIASES`).
+
+    Raises:
+        ValueError: if a required column is missing or a value is invalid.
+    """
+    fields = {CSV_ALIASES[key]: value or "" for key, value in row.items() if key and key in CSV_ALIASES}
+    return build_entry(
+        name=fields.get("name", ""),
+        account=fields.get("account", ""),
+        secret=fields.get("secret", ""),
+        digits=int(fields.get("digits") or 6),
+        period=int(fields.get("period") or 30),
+        algorithm=fields.get("algorithm") or "SHA1",
+    )
+
+
+def parse_lines(lines: typing.Iterable[str]) -> typing.Iterator[ImportedLine]:
+    """
+    Lazily parse otpauth:// URIs (one per line) or CSV with a header line, depending on the first line with content.
+
+    Empty lines and lines starting with '#' are skipped in URI lists, and before the header of a CSV file.
+    """
+    lines = iter(lines)
+    skipped: list[str] = []
+    first = ""
+    for line in lines:
+        if _has_content(line):
+            first = line
+            break
+        skipped.append(line)
+
+    if first and not first.lstrip().lower().startswith("otpauth://"):
+        reader = csv.DictReader(itertools.chain([first], lines))
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+        if "secret" not in reader.fieldnames:
+            yield ImportedLine(
+                len(skipped) + 1, None, "input is neither otpauth:// URIs nor CSV with a 'secret' column"
+            )
+            return
+
+        for row in reader:
+            yield _parse(len(skipped) + reader.line_num, parse_csv_row, row)
+        return
+
+    for number, line in enumerate(itertools.chain([first], lines), len(skipped) + 1):
+        if _has_content(line):
+            yield _parse(number, parse_otpauth, line)
+
+
+def _has_content(line: str) -> bool:
+    return bool(line.strip()) and not line.lstrip().startswith("#")
+
+
+def _parse(number: int, parser: typing.Callable[[T], AnyDict], value: T) -> ImportedLine:
+    try:
+        return ImportedLine(number, parser(value))
+    except ValueError as e:
+        return ImportedLine(number, None, str(e))
+
+
+def import_services(vault: Vault, lines: typing.Iterable[str]) -> ImportResult:
+    """
+    Add the services from some input to a vault (in memory, call `vault.save()` to write them).
+
+    Services that are already in the vault (same name, account and secret) or in the input are skipped.
+    """
+    return add_entries(vault, parse_lines(lines))
+
+
+def add_entries(vault: Vault, imported: typing.Iterable[ImportedLine]) -> ImportResult:
+    """
+    Add parsed entries to a vault (in memory), skipping duplicates; see `import_services`.
+    """
+    result = ImportResult()
+    known = {fingerprint(service) for service in vault.storage}
+
+    entries: list[AnyDict] = []
+    for line in imported:
+        if line.entry is None:
+            result.errors.append((line.line, line.error or "invalid"))
+            continue
+
+        key = fingerprint_entry(line.entry)
+        if key in known:
+            result.duplicates += 1
+            continue
+
+        known.add(key)
+        # after the existing services:
+        line.entry["order"] = {"position": len(vault.storage) + len(entries)}
+        entries.append(line.entry)
+
+    result.added = vault.edit(add=entries)
+    return result
@@ -0,0 +1,246 @@
+"""
+This file contains a TOTP implementation for generating many codes quickly.
+
+pyotp decodes the secret and sets up a new HMAC for every code it generates.
+Here, that work is done once per service: the secret is decoded and hashed into the inner and outer HMAC pads,
+after which each code only costs a copy of both hash states (RFC 2104).
+The digits and period are taken from the service (`otp.digits`, `otp.period`),
+whereas lib2fas' `service.generate()` always uses pyotp's defaults (6 digits, 30 seconds, sha1).
+"""
+
+import base64
+import hashlib
+import heapq
+import re
+import time
+import typing
+
+from lib2fas import TwoFactorAuthDetails
+
+T = typing.TypeVar("T")
+
+# same as the stdlib's hmac module:
+_INNER_PAD = bytes(x ^ 0x36 for x in range(256))
+_OUTER_PAD = bytes(x ^ 0x5C for x in range(256))
+
+
+class Keyed(typing.NamedTuple):
+    """
+    Hash states after the inner and outer HMAC pads, to be copied for every message.
+    """
+
+    inner: typing.Any  # hashlib object
+    outer: typing.Any
+
+
+BASE32_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+# base32 (RFC 4648) digits -> the digits int(..., 32) understands:
+_BASE32_TO_INT = str.maketrans(BASE32_ALPHABET + BASE32_ALPHABET.lower(), "0123456789abcdefghijklmnopqrstuv" * 2)
+_is_base32 = re.compile("[A-Za-z2-7]+").fullmatch
+
+
+def decode_secret(secret: str) -> bytes:
+    """
+    Decode a base32 secret like pyotp's `byte_secret()` does, but several times faster.
+
+    Invalid secrets go through `base64.b32decode`, so they raise the same errors.
+    """
+    bits = len(secret) * 5
+    if _is_base32(secret) and len(secret) % 8 not in (1, 3, 6):
+        # the last (bits % 8) bits don't make up a whole byte and are dropped, like b32decode does:
+        return (int(secret.translate(_BASE32_TO_INT), 32) >> (bits % 8)).to_bytes(bits // 8, "big")
+
+    return base64.b32decode(secret + "=" * (-len(secret) % 8), casefold=True)
+
+
+class PrecomputedTotp:
+    """
+    TOTP generator with the secret already decoded and loaded into an HMAC.
+    """
+
+    __slots__ = ("_keyed", "_modulo", "digits", "interval")
+
+    digits: int
+    interval: int
+    _keyed: Keyed
+    _modulo: int
+
+    def __init__(
+        self,
+        secret: bytes,
+        digits: int = 6,
+        interval: int = 30,
+        digest: typing.Callable[..., typing.Any] = hashlib.sha1,
+    ) -> None:
+        """
+        Set up the HMAC for a (decoded) secret.
+        """
+        self.digits = digits
+        self.interval = interval
+        inner = digest()
+        if len(secret) > inner.block_size:
+            secret = digest(secret).digest()
+        secret = secret.ljust(inner.block_size, b"\0")
+        inner.update(secret.translate(_INNER_PAD))
+        self._keyed = Keyed(inner, digest(secret.translate(_OUTER_PAD)))
+        self._modulo = 10**digits
+
+    @classmethod
+    def from_service(cls, service: TwoFactorAuthDetails) -> "PrecomputedTotp":
+        """
+        Use the digits and period of a service, or the defaults of the 2fas apps (6 digits, 30 seconds).
+
+        The algorithm is always sha1: lib2fas doesn't keep the 'algorithm' of a service when parsing it.
+        """
+        otp = service.otp
+        digits = (otp.digits if otp else None) or 6
+        interval = (otp.period if otp else None) or 30
+        return cls(decode_secret(service.secret), digits=digits, interval=interval)
+
+    def keyed(self) -> Keyed:
+        """
+        Get a private copy of the pre-keyed HMAC, e.g. to keep per thread.
+        """
+        return Keyed(self._keyed.inner.copy(), self._keyed.outer.copy())
+
+    def counter(self, for_time: float) -> int:
+        """
+        Which time window (counter) does a unix timestamp fall into?
+        """
+        return int(for_time) // self.interval
+
+    def at_counter(self, counter: int, keyed: Keyed | None = None) -> str:
+        """
+        Generate the code for a specific time window.
+
+        Args:
+            counter: the time window, see `counter()`
+            keyed: optional HMAC from `keyed()`, to avoid sharing this instance's HMAC between threads.
+        """
+        return str(self.value(counter.to_bytes(8, "big"), keyed)).zfill(self.digits)
+
+    def value(self, message: bytes, keyed: Keyed | None = None) -> int:
+        """
+        The code for an encoded counter (8 bytes, big endian) as a number, without the leading zeroes.
+
+        This allows encoding a counter once for many services with the same interval.
+        """
+        inner, outer = keyed or self._keyed
+        mac = inner.copy()
+        mac.update(message)
+        result = outer.copy()
+        result.update(mac.digest())
+        digest = result.digest()
+
+        # dynamic truncation (RFC 4226):
+        offset = digest[-1] & 0x0F
+        code = int.from_bytes(digest[offset : offset + 4], "big") & 0x7FFFFFFF
+        return code % self._modulo
+
+    def at(self, for_time: float) -> str:
+        """
+        Generate the code for a unix timestamp.
+        """
+        return self.at_counter(self.counter(for_time))
+
+    def now(self) -> str:
+        """
+        Generate the current code.
+        """
+        return self.at(time.time())
+
+
+def whois(
+    totps: typing.Iterable[tuple[T, PrecomputedTotp]],
+    code: str,
+    for_time: float,
+    window: int = 1,
+) -> list[tuple[T, int]]:
+    """
+    Find the services that generate `code` at `for_time`, or up to `window` periods before or after it.
+
+    Counters are encoded once per interval (not per service) and codes are compared as numbers,
+    so each service only costs a few HMAC copies.
+
+    Returns:
+        (item, offset) pairs, where offset is the amount of periods between `for_time` and the matching code
+        (0 = current code, -1 = previous code, 1 = next code).
+    """
+    code = code.replace(" ", "")
+    if not code.isdigit():
+        return []
+
+    target = int(code)
+    digits = len(code)
+    # current window first, then the closest neighbours:
+    offsets = sorted(range(-window, window + 1), key=abs)
+    messages: dict[int, list[tuple[int, bytes]]] = {}  # interval -> [(offset, encoded counter)]
+
+    matches = []
+    for item, totp in totps:
+        if totp.digits != digits:
+            continue
+
+        if (encoded := messages.get(totp.interval)) is None:
+            counter = totp.counter(for_time)
+            encoded = messages[totp.interval] = [
+                (offset, (counter + offset).to_bytes(8, "big")) for offset in offsets if counter + offset >= 0
+            ]
+
+        (inner, outer), modulo = totp._keyed, totp._modulo
+        for offset, message in encoded:
+            # inlined `totp.value(message)`, this is the hot loop:
+            mac = inner.copy()
+            mac.update(message)
+            result = outer.copy()
+            result.update(mac.digest())
+            digest = result.digest()
+            start = digest[-1] & 0x0F
+            if (int.from_bytes(digest[start : start + 4], "big") & 0x7FFFFFFF) % modulo == target:
+                matches.append((item, offset))
+                break
+
+    return matches
+
+
+def _codes_per_window(
+    totps: list[tuple[T, PrecomputedTotp]],
+    interval: int,
+    start: float,
+    end: float,
+) -> typing.Iterator[tuple[int, T, str]]:
+    """
+    Codes of services with the same interval, one window at a time (see `codes_between`).
+    """
+    for counter in range(max(int(start) // interval, 0), int(end) // interval + 1):
+        message = counter.to_bytes(8, "big")
+        timestamp = counter * interval
+        for item, totp in totps:
+            yield timestamp, item, str(totp.value(message)).zfill(totp.digits)
+
+
+def codes_between(
+    totps: typing.Iterable[tuple[T, PrecomputedTotp]],
+    start: float,
+    end: float,
+) -> typing.Iterator[tuple[int, T, str]]:
+    """
+    Lazily generate the code of every service for every time window between `start` and `end` (inclusive).
+
+    The counter of a window is encoded once for all services with the same interval,
+    and only one window is generated at a time, so memory doesn't grow with the length of the range.
+
+    Yields:
+        (start of the window as unix timestamp, item, code), ordered by time
+        (and by the order of `totps` within a window).
+    """
+    per_interval: dict[int, list[tuple[T, PrecomputedTotp]]] = {}
+    for item, totp in totps:
+        per_interval.setdefault(totp.interval, []).append((item, totp))
+
+    streams = [_codes_per_window(group, interval, start, end) for interval, group in per_interval.items()]
+    if len(streams) == 1:
+        # usual case: every service has the default interval of 30 seconds
+        yield from streams[0]
+    else:
+        yield from heapq.merge(*streams, key=lambda row: row[0])
@@ -0,0 +1,221 @@
+"""
+This file contains a small persistent cache of search queries (e.g. `2fas gh`) to the services they resolved to.
+
+A repeated query is resolved with exact name lookups instead of a fuzzy search through the whole vault.
+Every cached result is tied to the version of the vault it was found in (stat signature + amount of services),
+so when the file changes, the query is searched again and no (new) results are hidden.
+
+Separately, the services the user picks (e.g. in the interactive menu) are counted, and results are ordered by
+'frecency' (how often and how recently a service was picked), so the usual pick comes first.
+
+Only service identifiers (name + account) are stored, no secrets. Both parts are bounded.
+"""
+
+import json
+import os
+import tempfile
+import time
+import typing
+from pathlib import Path
+
+from lib2fas import TwoFactorAuthDetails, TwoFactorStorage
+
+from .cli_settings import config
+
+DEFAULT_QUERY_CACHE = config / "2fas-queries.json"
+
+MAX_QUERIES = 256
+MAX_SERVICES_PER_QUERY = 32  # queries with more results (e.g. 'e') are not worth caching
+MAX_PICKS = 256
+HALF_LIFE = 14 * 24 * 60 * 60  # a pick is worth half as much after two weeks
+
+Service: typing.TypeAlias = TwoFactorAuthDetails
+CacheEntry: typing.TypeAlias = dict[str, typing.Any]  # query: version, services, last; pick: count, last
+Version: typing.TypeAlias = list[int]
+
+
+def service_account(service: Service) -> str:
+    """
+    Account (username) of a service, which together with its name identifies it.
+    """
+    return (service.otp.account if service.otp else None) or ""
+
+
+def identifier(service: Service) -> tuple[str, str]:
+    """
+    (name, account) of a service as stored in the cache.
+    """
+    return (service.name or "").lower(), service_account(service).lower()
+
+
+def frecency(entry: CacheEntry, now: float) -> float:
+    """
+    Score of a pick: amount of picks, decaying with the time since the last pick.
+    """
+    age = max(now - entry["last"], 0)
+    return float(entry["count"] * 0.5 ** (age / HALF_LIFE))
+
+
+class QueryCache:
+    """
+    Maps (scope, query) to the services it resolved to, and (scope, service) to how often it was picked.
+
+    The scope is e.g. the filename (+ group), so results from different vaults don't mix.
+    """
+
+    path: Path
+    queries: dict[str, CacheEntry]
+    picks: dict[str, CacheEntry]
+    _dirty: bool
+
+    def __init__(
+        self,
+        queries: dict[str, CacheEntry] | None = None,
+        picks: dict[str, CacheEntry] | None = None,
+        path: Path = DEFAULT_QUERY_CACHE,
+    ) -> None:
+        """
+        Create a cache, usually done via `QueryCache.load()`.
+        """
+        self.path = path
+        self.queries = queries or {}
+        self.picks = picks or {}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path: str | Path = DEFAULT_QUERY_CACHE) -> "QueryCache":
+        """
+        Load the cache from disk; a missing or broken cache file results in an empty cache.
+        """
+        path = Path(path)
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            data = {}
+
+        if not isinstance(data, dict):
+            data = {}
+
+        queries, picks = data.get("queries"), data.get("picks")
+        return cls(queries if isinstance(queries, dict) else {}, picks if isinstance(picks, dict) else {}, path)
+
+    @staticmethod
+    def key(scope: str, query: str) -> str:
+        """
+        Key of a query in the cache.
+        """
+        return f"{scope}\n{query.strip().lower()}"
+
+    @staticmethod
+    def pick_key(scope: str, service: Service) -> str:
+        """
+        Key of a service in the picks.
+        """
+        name, account = identifier(service)
+        return f"{scope}\n{name}\n{account}"
+
+    def resolve(
+        self, scope: str, query: str, storage: TwoFactorStorage[Service], version: Version
+    ) -> list[Service] | None:
+        """
+        Get the cached results of a query, most picked first; or None if it has to be searched (again).
+
+        Only exact name lookups in `storage` are done, so this does not depend on the size of the vault.
+        A result from another version of the vault is never used, since the search could find more (or other)
+        services now.
+        """
+        key = self.key(scope, query)
+        if not (entry := self.queries.get(key)) or entry.get("version") != version:
+            return None
+
+        found: list[Service] = []
+        for name, account in entry["services"]:
+            # .get instead of storage[...], which would add missing keys to the storage's defaultdict:
+            candidates = storage._multidict.get(name, [])
+            if not (matches := [_ for _ in candidates if service_account(_).lower() == account]):
+                # the vault changed in a way the version doesn't show; search again.
+                self._drop(key)
+                return None
+            found.extend(matches)
+
+        entry["last"] = time.time()
+        self._dirty = True
+        return self.rank(scope, found)
+
+    def store(self, scope: str, query: str, services: list[Service], version: Version) -> list[Service]:
+        """
+        Remember the (complete) search results of a query for this version of the vault.
+
+        Returns:
+            the results, most picked first.
+        """
+        key = self.key(scope, query)
+        if len(services) > MAX_SERVICES_PER_QUERY:
+            self._drop(key)
+        else:
+            identifiers = list(dict.fromkeys(identifier(service) for service in services))
+            self.queries[key] = {"version": version, "services": identifiers, "last": time.time()}
+            self._dirty = True
+            self._evict()
+
+        return self.rank(scope, services)
+
+    def rank(self, scope: str, services: list[Service]) -> list[Service]:
+        """
+        Order services by how often (and how recently) they were picked, most frecent first.
+
+        Services that were never picked keep their order, after the picked ones.
+        """
+        if not self.picks:
+            return services
+
+        now = time.time()
+        scores = {
+            id(service): frecency(pick, now)
+            for service in services
+            if (pick := self.picks.get(self.pick_key(scope, service)))
+        }
+        return sorted(services, key=lambda service: -scores.get(id(service), 0.0))
+
+    def record(self, scope: str, services: typing.Iterable[Service], now: float = None) -> None:
+        """
+        Remember which services the user picked (again).
+        """
+        now = time.time() if now is None else now
+        for service in services:
+            pick = self.picks.setdefault(self.pick_key(scope, service), {"count": 0})
+            pick["count"] += 1
+            pick["last"] = now
+
+        self._dirty = True
+        if len(self.picks) > MAX_PICKS:
+            keep = sorted(self.picks, key=lambda key: frecency(self.picks[key], now), reverse=True)[:MAX_PICKS]
+            self.picks = {key: self.picks[key] for key in keep}
+
+    def _drop(self, key: str) -> None:
+        if self.queries.pop(key, None) is not None:
+            self._dirty = True
+
+    def _evict(self) -> None:
+        """
+        Keep only the MAX_QUERIES most recently used queries.
+        """
+        if len(self.queries) <= MAX_QUERIES:
+            return
+
+        keep = sorted(self.queries, key=lambda key: self.queries[key]["last"], reverse=True)[:MAX_QUERIES]
+        self.queries = {key: self.queries[key] for key in keep}
+
+    def save(self) -> None:
+        """
+        Write the cache to disk (if it changed), atomically so concurrent runs never see half a file.
+        """
+        if not self._dirty:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"queries": self.queries, "picks": self.picks}, f)
+        os.replace(tmp, self.path)
+        self._dirty = False
@@ -0,0 +1,176 @@
+"""
+This file contains a read-only storage that can be shared between threads (e.g. in a threaded web worker).
+
+`TwoFactorStorage` is not safe for that: it mutates on lookups (defaultdict) and lazily creates TOTP objects.
+`SharedStorage` does all of that work once, while loading, and never changes afterwards;
+so lookups and code generation don't need any locks.
+"""
+
+import threading
+import time
+import typing
+from pathlib import Path
+from types import MappingProxyType
+
+from lib2fas import TwoFactorAuthDetails, load_services
+from lib2fas.utils import fuzzy_match
+
+from .otp import Keyed, PrecomputedTotp
+
+Service: typing.TypeAlias = TwoFactorAuthDetails
+
+
+class SharedStorage:
+    """
+    Immutable, thread-safe collection of services.
+
+    Usage:
+        storage = SharedStorage.load("file.2fas", passphrase="...")
+        # in any thread:
+        for service in storage.find("github"):
+            storage.generate(service)
+    """
+
+    __slots__ = ("_by_name", "_local", "_services", "_totps")
+
+    _services: tuple[Service, ...]
+    _by_name: typing.Mapping[str, tuple[Service, ...]]
+    _totps: typing.Mapping[int, PrecomputedTotp]  # id(service) -> totp
+    _local: threading.local  # per thread: dict of id(service) -> pre-keyed HMAC
+
+    def __init__(self, services: typing.Iterable[Service]) -> None:
+        """
+        Index the services and prepare their TOTP generators.
+        """
+        services = tuple(services)
+
+        by_name: dict[str, list[Service]] = {}
+        for service in services:
+            by_name.setdefault((service.name or "").lower(), []).append(service)
+
+        object.__setattr__(self, "_services", services)
+        object.__setattr__(self, "_by_name", MappingProxyType({k: tuple(v) for k, v in by_name.items()}))
+        object.__setattr__(self, "_totps", MappingProxyType({id(_): PrecomputedTotp.from_service(_) for _ in services}))
+        object.__setattr__(self, "_local", threading.local())
+
+    @classmethod
+    def load(
+        cls, filename: str | Path, passphrase: str | None = None, key: bytes | None = None
+    ) -> "SharedStorage | None":
+        """
+        Load a .2fas file (see `lib2fas.load_services`), or None if the file does not exist.
+        """
+        if (storage := load_services(filename, passphrase=passphrase, key=key)) is None:
+            return None
+        return cls(storage)
+
+    def __setattr__(self, name: str, value: typing.Any) -> typing.NoReturn:
+        """
+        Prevent changes after loading.
+        """
+        raise AttributeError(f"{self.__class__.__name__} is read-only, can't set '{name}'.")
+
+    def __delattr__(self, name: str) -> typing.NoReturn:
+        """
+        Prevent changes after loading.
+        """
+        raise AttributeError(f"{self.__class__.__name__} is read-only, can't delete '{name}'.")
+
+    def __len__(self) -> int:
+        """
+        The length of the storage is the amount of services in it.
+        """
+        return len(self._services)
+
+    def __bool__(self) -> bool:
+        """
+        The storage is truthy if it has any services.
+        """
+        return bool(self._services)
+
+    def __iter__(self) -> typing.Iterator[Service]:
+        """
+        Allows for-looping through this storage.
+        """
+        return iter(self._services)
+
+    def __getitem__(self, name: str) -> tuple[Service, ...]:
+        """
+        Get all services with a specific name (case-insensitive), or an empty tuple.
+        """
+        return self._by_name.get(name.lower(), ())
+
+    def __contains__(self, name: object) -> bool:
+        """
+        Is there a service with this name (case-insensitive)?
+        """
+        return isinstance(name, str) and name.lower() in self._by_name
+
+    def keys(self) -> list[str]:
+        """
+        Return a list of service names in this storage.
+        """
+        return list(self._by_name.keys())
+
+    def find(self, target: str | None = None, fuzz_threshold: int = 75) -> tuple[Service, ...]:
+        """
+        Search services the same way as `TwoFactorStorage.find`: first exact by name, then fuzzy.
+        """
+        if not target:
+            return self._services
+
+        target = target.lower()
+        if exact := self._by_name.get(target):
+            return exact
+
+        by_key = tuple(
+            service
+            for name, services in self._by_name.items()
+            if fuzzy_match(name, target) > fuzz_threshold
+            for service in services
+        )
+        if by_key:
+            return by_key
+
+        # str is short, repr is json
+        return tuple(
+            service for service in self._services if fuzzy_match(repr(service).lower(), target) > fuzz_threshold
+        )
+
+    def _keyed(self, service: Service) -> tuple[PrecomputedTotp, Keyed]:
+        """
+        Get the TOTP generator of a service and this thread's own copy of its pre-keyed HMAC.
+        """
+        totp = self._totps[id(service)]
+
+        local: dict[int, Keyed] | None = getattr(self._local, "keyed", None)
+        if local is None:
+            local = self._local.keyed = {}
+
+        if (keyed := local.get(id(service))) is None:
+            keyed = local[id(service)] = totp.keyed()
+
+        return totp, keyed
+
+    def generate(self, service: Service, for_time: float | None = None) -> str:
+        """
+        Generate the TOTP code of a service in this storage (at the current time, by default).
+
+        Raises:
+            KeyError: if the service is not part of this storage.
+        """
+        totp, keyed = self._keyed(service)
+        return totp.at_counter(totp.counter(time.time() if for_time is None else for_time), keyed)
+
+    def generate_all(self, for_time: float | None = None) -> list[tuple[str, str]]:
+        """
+        Create TOTP codes for all services, like `TwoFactorStorage.generate()`.
+        """
+        for_time = time.time() if for_time is None else for_time
+        return [(service.name, self.generate(service, for_time)) for service in self._services]
+
+    def __repr__(self) -> str:
+        """
+        Representation for repr().
+        """
+        return f"<SharedStorage with {len(self._by_name)} keys and {len(self._services)} entries>"
@@ -0,0 +1,190 @@
+"""
+This file contains opt-in, local timing telemetry (`2fas --setting telemetry true`) and its summary (`2fas --stats`).
+
+Every invocation appends one JSON line with the command, the size of the vault
+and the time spent per phase (load, decrypt, parse, find, generate, render).
+Time spent waiting for the user (prompts) or sleeping (`--feed`) is recorded separately and not part of the total.
+No secrets, service names or file names are recorded, and nothing leaves the machine.
+"""
+
+import atexit
+import contextlib
+import json
+import os
+import time
+import typing
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from .cli_settings import config
+
+DEFAULT_TELEMETRY = config / "2fas-telemetry.jsonl"
+MAX_BYTES = 1_000_000  # after this, the file is rotated to '.1' (replacing the previous '.1')
+
+PHASES = ("load", "decrypt", "parse", "find", "generate", "render")
+PERCENTILES = (50, 95, 99)
+WAIT = "wait"  # measured like a phase, but left out of the total and the phases
+
+Record: typing.TypeAlias = dict[str, typing.Any]
+
+
+def _version(package: str) -> str | None:
+    try:
+        return version(package)
+    except PackageNotFoundError:  # pragma: no cover
+        return None
+
+
+class Telemetry:
+    """
+    Timings of the current invocation, written (once) when the process exits.
+
+    When disabled, measuring a phase does nothing.
+    """
+
+    enabled: bool
+    path: Path
+    command: str | None
+    vault_size: int | None
+    phases: dict[str, float]
+    _start: float
+    _registered: bool
+
+    def __init__(self, path: Path = DEFAULT_TELEMETRY) -> None:
+        """
+        Telemetry is disabled until `start` is called.
+        """
+        self.enabled = False
+        self.path = path
+        self.command = None
+        self.vault_size = None
+        self.phases = {}
+        self._start = time.perf_counter()
+        self._registered = False
+
+    def start(self, command: str, enabled: bool = True) -> None:
+        """
+        Start recording an invocation of a (sub)command, e.g. 'generate' or 'import'.
+        """
+        self.enabled = enabled
+        self.command = command
+        self.vault_size = None
+        self.phases = {}
+        self._start = time.perf_counter()
+        if enabled and not self._registered:
+            # also when the command ends with exit():
+            atexit.register(self.flush)
+            self._registered = True
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> typing.Generator[None, None, None]:
+        """
+        Add the time spent in this block to a phase (phases can be measured multiple times).
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def wait(self) -> typing.ContextManager[None]:
+        """
+        Measure time spent waiting (e.g. for the user), which does not count towards the total.
+        """
+        return self.phase(WAIT)
+
+    def record(self) -> Record:
+        """
+        The line to write for this invocation.
+        """
+        phases = dict(self.phases)
+        wait = phases.pop(WAIT, 0.0)
+        return {
+            "timestamp": int(time.time()),
+            "command": self.command,
+            "vault_size": self.vault_size,
+            "total": time.perf_counter() - self._start - wait,
+            "wait": wait,
+            "phases": phases,
+            "version": _version("2fas"),
+            "lib2fas": _version("lib2fas"),
+        }
+
+    def flush(self) -> None:
+        """
+        Append the record of this invocation (one write) and rotate the file when it gets too big.
+        """
+        if not self.enabled or not self.command:
+            return
+
+        self.enabled = False  # only once
+        line = json.dumps(self.record()) + "\n"
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.path.exists() and self.path.stat().st_size + len(line) > MAX_BYTES:
+                os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+
+            with self.path.open("a") as f:
+                f.write(line)
+        except OSError:  # pragma: no cover
+            # telemetry should never break the actual command
+            pass
+
+
+telemetry = Telemetry()
+
+
+def read_records(path: Path = DEFAULT_TELEMETRY) -> typing.Iterator[Record]:
+    """
+    Read the records from the rotated and the current file (oldest first), skipping broken lines.
+    """
+    for filepath in (path.with_name(path.name + ".1"), path):
+        try:
+            with filepath.open() as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # e.g. a half written line
+        except FileNotFoundError:
+            continue
+
+
+def percentile(values: list[float], percent: int) -> float:
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    rank = max(int(-(-len(values) * percent // 100)), 1)  # ceil
+    return values[min(rank, len(values)) - 1]
+
+
+def aggregate(records: typing.Iterable[Record]) -> dict[str, dict[str, typing.Any]]:
+    """
+    Percentiles of the total time and of each phase, per command.
+
+    Returns:
+        command -> {"count": ..., "vault_size": largest vault, "total": {50: ..., 95: ..., 99: ...}, "load": {...}, ...}
+    """
+    per_command: dict[str, dict[str, list[float]]] = {}
+    sizes: dict[str, int] = {}
+    for record in records:
+        command = record.get("command") or "?"
+        timings = per_command.setdefault(command, {})
+        timings.setdefault("total", []).append(record.get("total") or 0.0)
+        for phase, seconds in (record.get("phases") or {}).items():
+            timings.setdefault(phase, []).append(seconds)
+        sizes[command] = max(sizes.get(command, 0), record.get("vault_size") or 0)
+
+    result = {}
+    for command, timings in sorted(per_command.items()):
+        summary: dict[str, typing.Any] = {"count": len(timings["total"]), "vault_size": sizes[command]}
+        for phase, values in timings.items():
+            values.sort()
+            summary[phase] = {percent: percentile(values, percent) for percent in PERCENTILES}
+        result[command] = summary
+
+    return result
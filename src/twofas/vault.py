@@ -0,0 +1,619 @@
+"""
+This file deals with reading, decrypting and (atomically) writing .2fas files.
+"""
+
+import base64
+import contextlib
+import json
+import os
+import stat
+import sys
+import tempfile
+import time
+import typing
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import cryptography.exceptions
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from lib2fas import (
+    KeyringManagerProtocol,
+    TwoFactorAuthDetails,
+    TwoFactorStorage,
+    derive_key,
+    extract_salt,
+    keyring_manager,
+    new_auth_storage,
+    split_encrypted,
+)
+from lib2fas._types import AnyDict, into_class
+
+from .fingerprint import VaultDiff, fingerprint
+from .groups import GroupIndex
+from .otp import PrecomputedTotp
+from .telemetry import telemetry
+
+TwoFactorDetailStorage: typing.TypeAlias = TwoFactorStorage[TwoFactorAuthDetails]
+Signature: typing.TypeAlias = tuple[int, int, int]
+
+# one worker is enough: only one vault is decrypted at a time.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="2fas-decrypt")
+
+# fixed text the 2fas apps encrypt as 'reference', to check the passphrase of a file:
+REFERENCE = (
+    "tRViSsLKzd86Hprh4ceC2OP7xazn4rrt4xhfEUbOjxLX8Rc3mkISXE0lWbmnWfggogbBJhtYgpK6fMl1D6mtsy92R3HkdGfwuXbzLebqVFJsR7IZ"
+    "2w58t938iymwG4824igYy1wi6n2WDpO1Q1P69zwJGs2F5a1qP4MyIiDSD7NCV2OvidXQCBnDlGfmz0f1BQySRkkt4ryiJeCjD2o4QsveJ9uDBUn8"
+    "ELyOrESv5R5DMDkD4iAF8TXU7KyoJujd"
+)
+SALT_SIZE = 256  # bytes, same as the 2fas apps
+
+
+def read_vault_file(filename: str | Path) -> AnyDict | None:
+    """
+    Read the raw (still encrypted) JSON contents of a .2fas file, or None if it does not exist.
+    """
+    filepath = Path(filename).expanduser()
+    if not filepath.exists():
+        return None
+
+    data: AnyDict = json.loads(filepath.read_text())
+    return data
+
+
+def stat_signature(filename: str | Path) -> Signature | None:
+    """
+    Cheap way to tell whether a file was changed or replaced: (inode, size, modification time).
+    """
+    try:
+        info = os.stat(Path(filename).expanduser())
+    except FileNotFoundError:
+        return None
+
+    return info.st_ino, info.st_size, info.st_mtime_ns
+
+
+def decrypt_entries(encrypted: str, key: bytes) -> list[AnyDict]:
+    """
+    Decrypt 'servicesEncrypted' with an already derived key, into raw dicts (not parsed into classes yet).
+
+    Raises:
+        PermissionError: if the key is wrong.
+    """
+    credentials_enc, _, nonce = split_encrypted(encrypted)
+    try:
+        decrypted = AESGCM(key).decrypt(nonce, credentials_enc, None)
+    except cryptography.exceptions.InvalidTag as e:
+        raise PermissionError("Invalid passphrase or key for file.") from e
+
+    entries: list[AnyDict] = json.loads(decrypted)
+    return entries
+
+
+def encrypt(plaintext: bytes, key: bytes, salt: bytes) -> str:
+    """
+    Encrypt in the format of 'servicesEncrypted' (ciphertext:salt:nonce, base64), with a new nonce every time.
+    """
+    nonce = os.urandom(12)
+    ciphertext = AESGCM(key).encrypt(nonce, plaintext, None)
+    return ":".join(base64.b64encode(_).decode() for _ in (ciphertext, salt, nonce))
+
+
+def write_vault_file(filename: str | Path, data: AnyDict) -> None:
+    """
+    Replace a .2fas file atomically: readers (or a crash halfway) never see a partially written file.
+
+    The new contents are written to a temporary file in the same directory, which is then renamed over the old file.
+    """
+    filepath = Path(filename).expanduser()
+    # mkstemp creates the file readable for the current user only, which is kept for new files:
+    fd, tmp = tempfile.mkstemp(dir=filepath.parent, prefix=f".{filepath.name}.", suffix=".tmp")
+    try:
+        with contextlib.suppress(FileNotFoundError):
+            # an existing file keeps its permissions:
+            os.chmod(tmp, stat.S_IMODE(os.stat(filepath).st_mode))
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, filepath)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def encrypted_services(data: AnyDict) -> str | None:
+    """
+    The 'servicesEncrypted' string of a file, or None if the services are stored unencrypted.
+    """
+    if data.get("services"):
+        return None
+
+    encrypted: str | None = data.get("servicesEncrypted")
+    return encrypted
+
+
+def canonical(entry: AnyDict) -> str:
+    """
+    Stable string for a raw service dict, so unchanged services can be recognized after reloading.
+    """
+    return json.dumps(entry, sort_keys=True)
+
+
+def classify_changes(removed: list[TwoFactorAuthDetails], added: list[TwoFactorAuthDetails]) -> VaultDiff:
+    """
+    Pair up removed and added services with the same identity (issuer + account) as 'changed'.
+
+    Unlike `diff_services`, the inputs only contain services whose contents differ,
+    so an identical fingerprint (e.g. only the icon or order changed) also counts as a change.
+    """
+    result = VaultDiff()
+
+    by_identity: dict[tuple[str, str], list[TwoFactorAuthDetails]] = {}
+    for service in removed:
+        by_identity.setdefault(fingerprint(service).identity, []).append(service)
+
+    for service in added:
+        if candidates := by_identity.get(fingerprint(service).identity):
+            result.changed.append((candidates.pop(0), service))
+        else:
+            result.added.append(service)
+
+    result.removed.extend(service for services in by_identity.values() for service in services)
+    return result
+
+
+def metadata(data: AnyDict) -> AnyDict:
+    """
+    Everything in a file except the services, to write back unchanged (groups, schema version, reference, ...).
+    """
+    return {key: value for key, value in data.items() if key not in ("services", "servicesEncrypted")}
+
+
+def _discard(storage: TwoFactorDetailStorage, services: typing.Iterable[TwoFactorAuthDetails]) -> None:
+    """
+    Remove specific service objects from a storage (which only supports adding).
+
+    This changes the storage's internals, which is why lib2fas is pinned to a minor version in pyproject.toml.
+    """
+    for service in services:
+        name = (service.name or "").lower()
+        entries = storage._multidict[name]
+        entries[:] = [_ for _ in entries if _ is not service]
+        if not entries:
+            del storage._multidict[name]
+        storage.count -= 1
+
+
+class Vault:
+    """
+    A decrypted .2fas file, which can be reloaded cheaply when the file changes on disk.
+
+    The derived key is kept, so a new version of the file (with the same salt) can be decrypted without the KDF,
+    and edits can be encrypted again without asking for the passphrase.
+    Only services that were added or changed are parsed again;
+    unchanged service objects (and their TOTP state) stay the same.
+    """
+
+    filename: str
+    storage: TwoFactorDetailStorage
+    groups: GroupIndex
+
+    _key: bytes | None
+    _salt: bytes | None
+    _signature: Signature | None
+    _by_content: dict[str, list[TwoFactorAuthDetails]]  # canonical JSON -> services
+    _content_of: dict[int, str]  # id(service) -> canonical JSON
+    _totps: dict[int, PrecomputedTotp]
+    _manager: KeyringManagerProtocol
+    _meta: AnyDict
+
+    def __init__(
+        self,
+        filename: str,
+        entries: list[AnyDict],
+        key: bytes | None = None,
+        salt: bytes | None = None,
+        signature: Signature | None = None,
+        manager: KeyringManagerProtocol = keyring_manager,
+        groups: list[AnyDict] | None = None,
+        meta: AnyDict | None = None,
+    ) -> None:
+        """
+        Parse the (decrypted) entries of a file, usually done by `load_vault` or `load_services_in_background`.
+        """
+        self.filename = filename
+        self.storage = new_auth_storage()
+        self.groups = GroupIndex(groups)
+        self._key = key
+        self._salt = salt
+        self._signature = signature
+        self._by_content = {}
+        self._content_of = {}
+        self._totps = {}
+        self._manager = manager
+        self._meta = meta or {}
+        self._update(entries)
+
+    @classmethod
+    def unlock(
+        cls,
+        filename: str,
+        data: AnyDict,
+        passphrase: str | None,
+        signature: Signature | None = None,
+        manager: KeyringManagerProtocol = keyring_manager,
+    ) -> "Vault":
+        """
+        Derive the key and decrypt the contents of a file (as read by `read_vault_file`).
+
+        This is the expensive part of loading a vault, so it's what runs in the background.
+
+        Raises:
+            PermissionError: if the passphrase is wrong.
+        """
+        groups, meta = data.get("groups"), metadata(data)
+        if not (encrypted := encrypted_services(data)):
+            entries = data.get("services") or []
+            return cls(filename, entries, signature=signature, manager=manager, groups=groups, meta=meta)
+
+        with telemetry.phase("decrypt"):
+            salt = extract_salt(encrypted)
+            key = derive_key(passphrase or "", salt)
+            entries = decrypt_entries(encrypted, key)
+
+        # parsing the entries is measured separately (in `_update`):
+        return cls(filename, entries, key, salt, signature, manager, groups, meta)
+
+    @classmethod
+    def create(
+        cls,
+        filename: str,
+        passphrase: str | None,
+        manager: KeyringManagerProtocol = keyring_manager,
+    ) -> "Vault":
+        """
+        Start a new, empty file (written on `save`); without a passphrase, the services are stored unencrypted.
+        """
+        meta: AnyDict = {"groups": [], "schemaVersion": 4}
+        if not passphrase:
+            return cls(filename, [], manager=manager, meta=meta)
+
+        salt = os.urandom(SALT_SIZE)
+        key = derive_key(passphrase, salt)
+        meta["reference"] = encrypt(REFERENCE.encode(), key, salt)
+        return cls(filename, [], key, salt, manager=manager, meta=meta)
+
+    def _update(self, entries: list[AnyDict]) -> VaultDiff:
+        """
+        Swap in the new entries, reusing service objects for entries that did not change.
+        """
+        previous = self._by_content
+        current: dict[str, list[TwoFactorAuthDetails]] = {}
+
+        to_parse: list[tuple[str, AnyDict]] = []
+        for entry in entries:
+            content = canonical(entry)
+            if candidates := previous.get(content):
+                current.setdefault(content, []).append(candidates.pop())
+            else:
+                to_parse.append((content, entry))
+
+        with telemetry.phase("parse"):
+            added = into_class([entry for _, entry in to_parse], TwoFactorAuthDetails)
+        for (content, _), service in zip(to_parse, added):
+            current.setdefault(content, []).append(service)
+
+        removed = [service for services in previous.values() for service in services]
+        for service in removed:
+            self._totps.pop(id(service), None)
+
+        _discard(self.storage, removed)
+        self.storage.add(added)
+        self.groups.discard(removed)
+        self.groups.add(added)
+        self._by_content = current
+        self._content_of = {id(service): content for content, services in current.items() for service in services}
+        telemetry.vault_size = len(self.storage)
+
+        return classify_changes(removed, added)
+
+    def edit(
+        self,
+        remove: typing.Iterable[TwoFactorAuthDetails] = (),
+        add: typing.Iterable[AnyDict] = (),
+    ) -> list[TwoFactorAuthDetails]:
+        """
+        Remove services and add new (raw) entries in memory; nothing is written until `save`.
+
+        Unlike a reload, this only touches the given services, so many small edits stay cheap.
+
+        Returns:
+            The parsed services for the added entries.
+        """
+        removed = []
+        for service in remove:
+            if (content := self._content_of.pop(id(service), None)) is None:
+                continue  # not (or no longer) in this vault
+
+            services = self._by_content[content]
+            services[:] = [_ for _ in services if _ is not service]
+            if not services:
+                del self._by_content[content]
+
+            self._totps.pop(id(service), None)
+            removed.append(service)
+
+        entries = list(add)
+        with telemetry.phase("parse"):
+            added: list[TwoFactorAuthDetails] = into_class(entries, TwoFactorAuthDetails)
+        for entry, service in zip(entries, added):
+            content = canonical(entry)
+            self._by_content.setdefault(content, []).append(service)
+            self._content_of[id(service)] = content
+
+        _discard(self.storage, removed)
+        self.storage.add(added)
+        self.groups.discard(removed)
+        self.groups.add(added)
+        return added
+
+    def lookup(self, name: str, account: str | None = None) -> list[TwoFactorAuthDetails]:
+        """
+        Services with exactly this name (and account, if given), case-insensitive; unlike `find`, nothing fuzzy.
+        """
+        # .get instead of storage[...], which would add missing keys to the storage's defaultdict:
+        services = self.storage._multidict.get(name.lower(), [])
+        if account is None:
+            return list(services)
+
+        account = account.lower()
+        return [_ for _ in services if ((_.otp.account if _.otp else None) or "").lower() == account]
+
+    def entry(self, service: TwoFactorAuthDetails) -> AnyDict:
+        """
+        Copy of the raw entry (as stored in the file) of a service in this vault, e.g. to edit and `edit` back.
+        """
+        entry: AnyDict = json.loads(self._content_of[id(service)])
+        return entry
+
+    def save(self) -> None:
+        """
+        Write all services to the file with one atomic replace.
+
+        An encrypted file is encrypted again with the key that was derived when loading it (same salt, new nonce),
+        so no key derivation or passphrase is needed.
+        """
+        # the canonical JSON of every entry is kept, so unchanged entries don't have to be serialized again:
+        contents = [content for content, services in self._by_content.items() for _ in services]
+        data = dict(self._meta, updatedAt=int(time.time() * 1000))
+        if self._key is not None and self._salt is not None:
+            data["services"] = []
+            data["servicesEncrypted"] = encrypt(f"[{','.join(contents)}]".encode(), self._key, self._salt)
+        else:
+            data["services"] = [json.loads(content) for content in contents]
+
+        write_vault_file(self.filename, data)
+        # our own write should not trigger a reload:
+        self._signature = stat_signature(self.filename)
+
+    def changed(self) -> bool:
+        """
+        Was the file changed on disk since it was (re)loaded?
+        """
+        return stat_signature(self.filename) != self._signature
+
+    def reload(self) -> VaultDiff:
+        """
+        Read the file again and only update the services that were added, removed or changed.
+
+        If the salt is the same, the key from the previous load is reused; otherwise the passphrase is needed again.
+        A file that was (temporarily) removed or is only partially written keeps the current services.
+        """
+        signature = stat_signature(self.filename)
+        try:
+            with telemetry.phase("load"):
+                data = read_vault_file(self.filename)
+        except ValueError:
+            # e.g. still being written by a sync tool; try again on the next refresh.
+            return VaultDiff()
+
+        if data is None:
+            return VaultDiff()
+
+        return self._apply(data, signature)
+
+    def _apply(self, data: AnyDict, signature: Signature | None) -> VaultDiff:
+        """
+        Decrypt (if needed) the contents of the file and swap in the services that changed.
+        """
+        if not (encrypted := encrypted_services(data)):
+            entries = data.get("services") or []
+        elif self._key is not None and extract_salt(encrypted) == self._salt:
+            with telemetry.phase("decrypt"):
+                entries = decrypt_entries(encrypted, self._key)
+        else:
+            # re-exported file (new salt), so derive a new key:
+            entries = self._unlock_interactive(encrypted)
+
+        self._signature = signature
+        self._meta = metadata(data)
+        self.groups.set_groups(data.get("groups") or [])
+        return self._update(entries)
+
+    def refresh(self) -> VaultDiff | None:
+        """
+        Reload the file only if it changed on disk (returns None if it didn't).
+        """
+        return self.reload() if self.changed() else None
+
+    def _unlock_interactive(self, encrypted: str) -> list[AnyDict]:
+        """
+        Get the passphrase from the keyring (or the user), until it decrypts the file.
+        """
+        salt = extract_salt(encrypted)
+        while True:
+            manager = self._manager
+            with telemetry.wait():  # the user may be asked for the passphrase
+                passphrase = manager.retrieve_credentials(self.filename) or manager.save_credentials(self.filename)
+            try:
+                with telemetry.phase("decrypt"):
+                    key = derive_key(passphrase, salt)
+                    entries = decrypt_entries(encrypted, key)
+            except PermissionError as e:
+                print(e, file=sys.stderr)
+                self._manager.delete_credentials(self.filename)
+                continue
+
+            self._key, self._salt = key, salt
+            return entries
+
+    def select(self, group: str | None = None) -> TwoFactorDetailStorage | None:
+        """
+        All services, or only the services in one group (None if there is no such group).
+
+        Without a group, the storage of this vault itself is returned (which is updated on reload);
+        with a group, a new storage with only that subset is created.
+        """
+        if not group:
+            return self.storage
+
+        if (services := self.groups.find(group)) is None:
+            return None
+
+        return new_auth_storage(services)
+
+    def totp(self, service: TwoFactorAuthDetails) -> PrecomputedTotp:
+        """
+        Get the (cached) precomputed TOTP generator for a service in this vault.
+        """
+        if (totp := self._totps.get(id(service))) is None:
+            totp = self._totps[id(service)] = PrecomputedTotp.from_service(service)
+        return totp
+
+    def __repr__(self) -> str:
+        """
+        Representation for repr().
+        """
+        return f"<Vault '{self.filename}' with {len(self.storage)} entries>"
+
+
+def load_vault(filename: str, manager: KeyringManagerProtocol = keyring_manager) -> Vault | None:
+    """
+    Load a .2fas file into a Vault, asking for the passphrase (again) until it's correct.
+
+    Unlike `Vault.reload`, which keeps the current services when the file is only partially written,
+    a file that can't be read is an error here: an empty vault would otherwise be saved over it.
+
+    Returns:
+        None if the file does not exist.
+
+    Raises:
+        ValueError: if the file is not valid JSON (e.g. truncated).
+    """
+    signature = stat_signature(filename)
+    with telemetry.phase("load"):
+        if (data := read_vault_file(filename)) is None:
+            return None
+
+    vault = Vault(filename, [], manager=manager)
+    vault._apply(data, signature)
+    return vault
+
+
+class PendingServices:
+    """
+    The services of a .2fas file, which may still be decrypting in a background thread.
+
+    Created via `load_services_in_background`.
+    Call `.result()` when the services are actually needed; this only blocks for the remaining derivation time.
+    """
+
+    filename: str
+    _future: "Future[Vault | None]"
+    _manager: KeyringManagerProtocol
+
+    def __init__(
+        self,
+        filename: str,
+        future: "Future[Vault | None]",
+        manager: KeyringManagerProtocol = keyring_manager,
+    ) -> None:
+        """
+        Wrap a future (usually done by `load_services_in_background`).
+        """
+        self.filename = filename
+        self._future = future
+        self._manager = manager
+
+    @classmethod
+    def resolved(
+        cls, filename: str, vault: Vault | None, manager: KeyringManagerProtocol = keyring_manager
+    ) -> "PendingServices":
+        """
+        Wrap a vault that was already loaded (or failed to load) without a background thread.
+        """
+        future: Future[Vault | None] = Future()
+        future.set_result(vault)
+        return cls(filename, future, manager)
+
+    def done(self) -> bool:
+        """
+        Is the decryption finished (successful or not)?
+        """
+        return self._future.done()
+
+    def failed(self) -> bool:
+        """
+        Is it already known that there are no services (e.g. the file does not exist)?
+
+        Returns False while still decrypting, so menus don't have to wait for this.
+        """
+        return self.done() and self._future.exception() is None and self._future.result() is None
+
+    def ready(self) -> Vault | None:
+        """
+        The vault, if decrypting it already succeeded; never waits (or asks for the passphrase again).
+        """
+        if not self.done() or self._future.exception() is not None:
+            return None
+        return self._future.result()
+
+    def result(self) -> Vault | None:
+        """
+        Wait for the background decryption to finish.
+
+        If the stored passphrase turned out to be wrong, it's removed from the keyring and the user is asked again.
+        """
+        try:
+            return self._future.result()
+        except PermissionError as e:
+            print(e, file=sys.stderr)
+            self._manager.delete_credentials(self.filename)
+
+            vault = load_vault(self.filename, self._manager)
+            self._future = Future()
+            self._future.set_result(vault)
+            return vault
+
+
+def load_services_in_background(filename: str, manager: KeyringManagerProtocol = keyring_manager) -> PendingServices:
+    """
+    Ask for the passphrase of a .2fas file right away, then decrypt it in a background thread.
+
+    Unencrypted and missing files are handled synchronously, since there's nothing expensive to do.
+    """
+    manager.cleanup_keyring()
+
+    signature = stat_signature(filename)
+    with telemetry.phase("load"):
+        data = read_vault_file(filename)
+    if data is None:
+        return PendingServices.resolved(filename, None, manager)
+
+    if not encrypted_services(data):
+        return PendingServices.resolved(filename, Vault.unlock(filename, data, None, signature, manager), manager)
+
+    with telemetry.wait():  # the user may be asked for the passphrase
+        passphrase = manager.retrieve_credentials(filename) or manager.save_credentials(filename)
+    future: Future[Vault | None] = _executor.submit(Vault.unlock, filename, data, passphrase, signature, manager)
+    return PendingServices(filename, future, manager)
@@ -1,7 +1,25 @@
+import inspect
+import os
+import shutil
+
+import pytest
+import questionary
 from typer.testing import CliRunner
 
+from src.twofas import cli
 from src.twofas.__about__ import __version__
-from src.twofas.cli import app
+from src.twofas.cli import (
+    app,
+    command_add,
+    command_interactive,
+    command_name,
+    command_rename,
+    command_rm,
+    parse_timestamp,
+)
+from src.twofas.vault import PendingServices, Vault, load_vault
+
+from ._shared import CWD
 
 # by default, click's cli runner mixes stdout and stderr for some reason...
 runner = CliRunner(mix_stderr=False)
@@ -10,3 +28,189 @@ runner = CliRunner(mix_stderr=False)
 def test_app():
     result = runner.invoke(app, ["--version"])
     assert __version__ in result.stdout.strip()
+
+
+def test_parse_timestamp():
+    assert parse_timestamp("1700000000") == 1_700_000_000
+    assert parse_timestamp("2023-11-14T22:13:20Z") == 1_700_000_000
+    assert parse_timestamp("2023-11-14T23:13:20+01:00") == 1_700_000_000
+
+
+class Answer:
+    def __init__(self, answer: str) -> None:
+        self.answer = answer
+
+    def ask(self) -> str:
+        return self.answer
+
+
+def test_interactive_stack(monkeypatch):
+    # going back and forth between the menus many times:
+    answers = ["settings", "back"] * 500 + ["exit"]
+    depths = []
+
+    def select(*_, **__):
+        depths.append(len(inspect.stack(0)))
+        return Answer(answers.pop(0))
+
+    loaded = []
+
+    def load(filename, *_):
+        loaded.append(filename)
+        return PendingServices.resolved(filename, None)
+
+    monkeypatch.setattr(questionary, "select", select)
+    monkeypatch.setattr(os, "system", lambda _: 0)  # @clear
+    monkeypatch.setattr(cli, "load_services_in_background", load)
+
+    with pytest.raises(SystemExit):
+        command_interactive("/tmp/2fas-interactive.2fas")
+
+    assert not answers
+    # every menu is shown at the same stack depth:
+    assert len(set(depths)) == 1
+    # and the file is only loaded once per session:
+    assert loaded == ["/tmp/2fas-interactive.2fas"]
+
+
+class KnownFiles:
+    def __init__(self) -> None:
+        self.files: list[str] = []
+
+    def add_file(self, filename: str) -> None:
+        self.files.append(filename)
+
+
+def test_edit_commands(tmp_path, monkeypatch):
+    settings = KnownFiles()
+    # state.settings is only loaded by main():
+    monkeypatch.setitem(vars(cli.state), "settings", settings)
+    path = tmp_path / "edit.2fas"
+    shutil.copy(CWD / "2fas-demo-nopass.2fas", path)
+    target = str(path)
+
+    command_add(["Foo", "JBSWY3DPEHPK3PXP", "bob", target])
+    with pytest.raises(SystemExit):
+        # already present (regardless of case or spaces):
+        command_add(["foo", "jbsw y3dp ehpk 3pxp", "Bob", target])
+    command_add(
+        ["otpauth://totp/Bar:x?secret=JBSWY3DPEHPK3PXQ", "otpauth://totp/Baz:y?secret=JBSWY3DPEHPK3PXR", target]
+    )
+    with pytest.raises(SystemExit):
+        # already present:
+        command_add(["otpauth://totp/Bar:x?secret=JBSWY3DPEHPK3PXQ", target])
+
+    with pytest.raises(SystemExit):
+        # two accounts:
+        command_rm(["Example 1", target])
+    command_rm(["example 1:other additional info", "Foo", target])
+    command_rename(["Bar", "Bar2", "Baz", "Baz2", target])
+
+    vault = load_vault(target)
+    assert vault.storage.keys() == ["example 1", "example 2", "example 3", "bar2", "baz2"]
+    assert [_.otp.account for _ in vault.lookup("Example 1")] == ["Additional Info"]
+    assert vault.lookup("Example 1", "nope") == []
+
+    # a file created by `add` is remembered:
+    new = str(tmp_path / "new.2fas")
+    monkeypatch.setattr(cli.keyring_manager, "save_credentials", lambda _: "")
+    command_add(["Foo", "JBSWY3DPEHPK3PXP", new])
+    assert settings.files[-1] == new
+    assert len(load_vault(new).storage) == 1
+
+
+@pytest.mark.parametrize(
+    "command", [["add", "New", "JBSWY3DPEHPK3PXP"], ["rm", "Example 2"], ["rename", "Example 2", "Other"]]
+)
+def test_edit_broken_file(tmp_path, command):
+    path = tmp_path / "broken.2fas"
+    # e.g. only partially synced:
+    contents = (CWD / "2fas-demo-nopass.2fas").read_bytes()[:100]
+    path.write_bytes(contents)
+
+    name, *args = command
+    with pytest.raises(SystemExit):
+        getattr(cli, f"command_{name}")([*args, str(path)])
+
+    assert path.read_bytes() == contents
+
+
+def test_command_name():
+    flags = {"menu": False, "all": False}
+    assert command_name([], flags) == "interactive"
+    assert command_name(["file.2fas"], flags) == "interactive"
+    assert command_name(["github", "file.2fas"], flags) == "generate"
+    assert command_name(["import", "uris.txt"], flags) == "import"
+    assert command_name(["file.2fas"], {"menu": False, "all": True}) == "all"
+
+
+def test_generate_with_vault(capsys):
+    vault = load_vault(str(CWD / "2fas-demo-nopass.2fas"))
+    cli.generate_all_totp(vault.storage, vault)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines == [f"- {service.name}: {service.generate()}" for service in vault.storage]
+    # the generators are cached in the vault for the next code:
+    assert len(vault._totps) == len(vault.storage)
+
+
+@pytest.mark.parametrize("group", ["nope", None])
+def test_interactive_unavailable(monkeypatch, tmp_path, group):
+    if group:
+        vault = load_vault(str(CWD / "2fas-demo-nopass.2fas"))
+    else:
+        vault = Vault.create(str(tmp_path / "empty.2fas"), None)
+
+    disabled = []
+
+    def select(*_, choices, **__):
+        disabled.append({choice.value: choice.disabled for choice in choices if choice.disabled})
+        return Answer("exit")
+
+    monkeypatch.setattr(questionary, "select", select)
+    monkeypatch.setattr(os, "system", lambda _: 0)  # @clear
+    monkeypatch.setattr(cli, "load_services_in_background", lambda *_: PendingServices.resolved(vault.filename, vault))
+    monkeypatch.setattr(cli.state, "group", group)
+
+    with pytest.raises(SystemExit):
+        command_interactive(vault.filename)
+
+    # instead of redrawing the menu forever, these options can't be chosen:
+    assert set(disabled[0]) == {"generate-one", "generate-all", "see-info", "whois"}
+
+
+def test_whois_interactive(monkeypatch, capsys):
+    vault = load_vault(str(CWD / "2fas-demo-nopass.2fas"))
+    service = vault.lookup("Example 2")[0]
+    answers = [service.generate(), "000000x", ""]
+    monkeypatch.setattr(questionary, "text", lambda *_, **__: Answer(answers.pop(0)))
+
+    cli.whois_interactive(vault.storage, vault)
+
+    out = capsys.readouterr().out
+    assert f"- Example 2 ({service.otp.account}): current code" in out
+    assert "No service generates 000000x" in out
+    # the pre-keyed HMACs are kept for the next lookup:
+    assert len(vault._totps) == len(vault.storage)
+
+
+def test_import_missing_input(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        cli.command_import([str(tmp_path / "missing.txt"), str(tmp_path / "new.2fas")])
+
+    # (rich wraps long lines)
+    assert "missing.txt: no such file" in " ".join(capsys.readouterr().err.split())
+    assert not (tmp_path / "new.2fas").exists()
+
+
+def test_import_broken_target(tmp_path):
+    path = tmp_path / "broken.2fas"
+    path.write_bytes((CWD / "2fas-demo-nopass.2fas").read_bytes()[:100])
+    uris = tmp_path / "uris.txt"
+    uris.write_text("otpauth://totp/New:x?secret=JBSWY3DPEHPK3PXP\n")
+
+    with pytest.raises(SystemExit):
+        cli.command_import([str(uris), str(path)])
+
+    # not replaced by a file with only the new service:
+    assert path.read_bytes() == (CWD / "2fas-demo-nopass.2fas").read_bytes()[:100]
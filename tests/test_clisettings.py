@@ -1,11 +1,19 @@
 import tempfile
+from contextlib import nullcontext
 from pathlib import Path
 
 import pytest
 from configuraptor import Singleton
 from configuraptor.errors import ConfigErrorExtraKey
 
-from src.twofas.cli_settings import expand_path, get_cli_setting, load_cli_settings, set_cli_setting
+from src.twofas.cli_settings import (
+    CliSettings,
+    expand_path,
+    get_cli_setting,
+    load_cli_settings,
+    read_cli_settings,
+    set_cli_setting,
+)
 
 
 @pytest.fixture()
@@ -113,3 +121,37 @@ def test_expand_path():
     assert expand_path(None) == ""
     assert expand_path("") == ""
     assert expand_path("local").startswith("/")
+
+
+@pytest.mark.parametrize(
+    "contents",
+    [
+        "",
+        EXAMPLE_CONFIG,
+        "[tool.2fas]\nauto_verbose = true\nunknown = 1\n",
+        "[tool.2fas]\ntelemetry = true\n",
+        "[tool.other]\nfiles = ['x']\n",
+        "[tool.2fas]\ndefault_file = '${HOME}/file.2fas'\n",
+        "this is not toml",
+    ],
+)
+def test_read_same_as_load(empty_temp_config, contents):
+    empty_temp_config.write_text(contents)
+
+    with pytest.warns() if contents == "this is not toml" else nullcontext():
+        loaded = dict(load_cli_settings(empty_temp_config).__dict__)
+    Singleton.clear()
+
+    with pytest.warns() if contents == "this is not toml" else nullcontext():
+        read = read_cli_settings(empty_temp_config)
+
+    assert read.__dict__ == loaded
+    assert read is CliSettings()  # still the singleton
+
+
+def test_read_missing(reset_state):
+    settings = read_cli_settings("/tmp/2fas-test-missing.toml")
+
+    assert not settings.files
+    assert not settings.default_file
+    assert not settings.auto_verbose
@@ -0,0 +1,70 @@
+import itertools
+
+import pyotp
+
+from src.twofas.feed import feed_lines, next_change, render_feed
+from src.twofas.otp import PrecomputedTotp
+
+
+def make_totps(*intervals: int) -> list[tuple[str, PrecomputedTotp]]:
+    return [
+        (f"service{idx}", PrecomputedTotp(pyotp.TOTP(pyotp.random_base32()).byte_secret(), interval=interval))
+        for idx, interval in enumerate(intervals)
+    ]
+
+
+class FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+        self.sleeps: list[float] = []
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_render_feed():
+    totps = make_totps(30)
+    _, totp = totps[0]
+
+    start = 1_700_000_010  # 1_700_000_010 % 30 == 0
+
+    assert render_feed(totps, start) == f"service0 {totp.at(start)} 30s"
+    assert render_feed(totps, start + 10) == f"service0 {totp.at(start)} 20s"
+    assert render_feed(totps, start + 11) == f"service0 {totp.at(start)} 20s"
+    assert render_feed(totps, start + 11, bucket=0) == f"service0 {totp.at(start)}"
+    assert " | " in render_feed(make_totps(30, 60), 1_700_000_000)
+
+
+def test_next_change():
+    totps = make_totps(30)
+    start = 1_700_000_010  # 1_700_000_010 % 30 == 0
+
+    assert next_change(totps, start) == start + 5
+    assert next_change(totps, start + 2.5) == start + 5
+    assert next_change(totps, start + 29) == start + 30
+    assert next_change(totps, start + 1, bucket=0) == start + 30
+    assert next_change(totps, start + 1, bucket=60) == start + 30
+    assert next_change(totps, start + 1, bucket=7) == start + 2  # remaining 28 -> shown as 28 instead of 35
+
+    assert next_change(make_totps(30, 60), start + 22, bucket=0) == start + 30
+
+
+def test_feed_lines():
+    clock = FakeClock(1_700_000_010.5)
+    lines = list(itertools.islice(feed_lines(make_totps(30), clock=clock.time, sleep=clock.sleep), 7))
+
+    # one line per bucket, with exactly one sleep in between (no polling):
+    assert [line.rsplit(" ", 1)[-1] for line in lines] == ["30s", "25s", "20s", "15s", "10s", "5s", "30s"]
+    assert clock.sleeps == [4.5, 5, 5, 5, 5, 5]
+    assert lines[0].split()[1] != lines[-1].split()[1]
+
+    clock = FakeClock(1_700_000_010)
+    lines = list(itertools.islice(feed_lines(make_totps(30), bucket=0, clock=clock.time, sleep=clock.sleep), 3))
+    assert len(set(lines)) == 3
+    assert clock.sleeps == [30, 30]
+
+    assert not list(feed_lines([]))
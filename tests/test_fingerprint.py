@@ -0,0 +1,98 @@
+from lib2fas import TwoFactorAuthDetails, load_services
+
+from src.twofas.fingerprint import diff_services, find_duplicates, fingerprint, hash_secret
+
+from ._shared import CWD
+
+
+def make_service(name: str, secret: str, account: str = None) -> TwoFactorAuthDetails:
+    return TwoFactorAuthDetails.load(
+        {
+            "name": name,
+            "secret": secret,
+            "updatedAt": 0,
+            "otp": {"account": account} if account else None,
+        }
+    )
+
+
+def test_fingerprint():
+    assert hash_secret("JBSW Y3DP EHPK 3PXP") == hash_secret("jbswy3dpehpk3pxp==")
+
+    fp = fingerprint(make_service("GitHub", "JBSWY3DPEHPK3PXP", "Alice"))
+    assert fp.identity == ("github", "alice")
+    assert "JBSWY3DPEHPK3PXP" not in fp
+
+    assert fingerprint(make_service("GitHub", "JBSWY3DPEHPK3PXP")).account == ""
+
+
+def test_diff_services():
+    old = [
+        make_service("Same", "AAAA"),
+        make_service("Removed", "BBBB"),
+        make_service("Changed", "CCCC", "user"),
+        make_service("Twice", "DDDD"),
+        make_service("Twice", "EEEE"),
+    ]
+    new = [
+        make_service("Twice", "EEEE"),
+        make_service("Twice", "DDDD"),
+        make_service("Changed", "FFFF", "user"),
+        make_service("Same", "AAAA"),
+        make_service("Added", "GGGG"),
+        make_service("Copy of Added", "GGGG"),
+    ]
+
+    result = diff_services(old, new)
+    assert result
+    assert [_.name for _ in result.added] == ["Added", "Copy of Added"]
+    assert [_.name for _ in result.removed] == ["Removed"]
+    assert [(a.secret, b.secret) for a, b in result.changed] == [("CCCC", "FFFF")]
+    assert [(side, _.name) for side, _ in result.duplicates] == [("new", "Copy of Added")]
+
+    assert not diff_services(old, old[::-1])
+
+
+def test_diff_duplicates():
+    old = [make_service("One", "AAAA"), make_service("Copy of One", "AAAA")]
+    new = [make_service("Two", "BBBB"), make_service("Copy of Two", "BBBB")]
+
+    result = diff_services(old, new)
+    assert [(side, _.name) for side, _ in result.duplicates] == [("old", "Copy of One"), ("new", "Copy of Two")]
+
+
+def test_diff_shared_identity():
+    # many services with the same name and no account:
+    old = [make_service("Same", secret) for secret in ("AAAA", "BBBB", "CCCC", "DDDD")]
+    new = [make_service("Same", secret) for secret in ("DDDD", "EEEE", "BBBB")]
+
+    result = diff_services(old, new)
+    assert not result.added
+    assert [(a.secret, b.secret) for a, b in result.changed] == [("AAAA", "EEEE")]
+    assert [_.secret for _ in result.removed] == ["CCCC"]
+
+
+def test_diff_files():
+    decrypted = load_services(CWD / "2fas-demo-pass.2fas", passphrase="test")
+    plain = load_services(CWD / "2fas-demo-nopass.2fas")
+
+    assert not diff_services(decrypted, plain)
+
+
+def test_find_duplicates():
+    groups = find_duplicates(
+        {
+            "a.2fas": [make_service("One", "AAAA"), make_service("Two", "BBBB")],
+            "b.2fas": [make_service("One", "aaaa"), make_service("Three", "CCCC")],
+            "c.2fas": [make_service("One again", "AAAA")],
+        }
+    )
+
+    assert len(groups) == 1
+    assert [(label, service.name) for label, service in groups[0]] == [
+        ("a.2fas", "One"),
+        ("b.2fas", "One"),
+        ("c.2fas", "One again"),
+    ]
+
+    assert not find_duplicates({})
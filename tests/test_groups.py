@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+
+from lib2fas import TwoFactorAuthDetails
+
+from src.twofas.groups import GroupIndex
+from src.twofas.vault import load_vault, read_vault_file
+
+from ._shared import CWD
+
+GROUPS = [
+    {"id": "g-1", "name": "Work"},
+    {"id": "g-2", "name": "Private"},
+    {"id": "g-3"},
+]
+
+
+def make_service(name: str, group_id: str = None) -> TwoFactorAuthDetails:
+    return TwoFactorAuthDetails.load({"name": name, "secret": "JBSWY3DPEHPK3PXP", "updatedAt": 0, "groupId": group_id})
+
+
+def test_group_id_case():
+    # ids (e.g. uppercase UUIDs from iOS exports) are case-insensitive too:
+    service = make_service("d", "4F2A-ABC")
+    index = GroupIndex([{"id": "4F2A-ABC"}])
+    index.add([service])
+    assert index.find("4F2A-ABC") == index.find("4f2a-abc") == [service]
+
+
+def test_group_index():
+    work, private, loose = make_service("a", "g-1"), make_service("b", "g-2"), make_service("c")
+
+    index = GroupIndex(GROUPS)
+    index.add([work, private, loose])
+
+    assert index.keys() == ["Work", "Private", "g-3"]
+    assert index.find("work") == [work]
+    assert index.find("g-2") == [private]
+    assert index.find("g-3") == []
+    assert index.find("missing") is None
+
+    index.discard([work, loose])
+    index.discard([make_service("d", "g-unknown")])
+    assert index.find("Work") == []
+
+    assert GroupIndex().keys() == []
+
+
+def test_vault_select(tmp_path):
+    vault = load_vault(str(CWD / "2fas-demo-nopass.2fas"))
+
+    assert vault.select() is vault.storage
+    assert vault.select("nothing") is None
+    assert [_.name for _ in vault.select("Folder 1")] == ["Example 3"]
+
+    # groups are kept up to date on reload:
+    path = tmp_path / "copy.2fas"
+    shutil.copy(CWD / "2fas-demo-nopass.2fas", path)
+    vault = load_vault(str(path))
+
+    data = read_vault_file(path)
+    data["groups"].append({"id": "new-group", "name": "Folder 2"})
+    data["services"][0]["groupId"] = "new-group"
+    path.write_text(json.dumps(data))
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000_000))
+
+    assert vault.refresh()
+    assert [_.otp.account for _ in vault.select("folder 2")] == ["Additional Info"]
+    assert len(vault.select("folder 1")) == 1
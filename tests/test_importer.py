@@ -0,0 +1,101 @@
+import io
+
+import pyotp
+import pytest
+
+from src.twofas.importer import import_services, parse_csv_row, parse_lines, parse_otpauth
+from src.twofas.otp import PrecomputedTotp
+from src.twofas.vault import Vault, load_vault
+
+from ._shared import CWD
+
+FILENAME_NOPASS = str(CWD / "2fas-demo-nopass.2fas")
+
+
+def test_parse_otpauth():
+    entry = parse_otpauth("otpauth://totp/ACME%20Co:john@example.com?secret=jbsw y3dp ehpk 3pxp&issuer=ACME%20Co")
+    assert entry["name"] == "ACME Co"
+    assert entry["secret"] == "JBSWY3DPEHPK3PXP"
+    assert entry["otp"]["account"] == "john@example.com"
+    assert entry["otp"]["digits"] == 6
+
+    # issuer only in the label:
+    entry = parse_otpauth("otpauth://totp/Example:alice?secret=JBSWY3DPEHPK3PXP&digits=8&period=60")
+    assert (entry["name"], entry["otp"]["digits"], entry["otp"]["period"]) == ("Example", 8, 60)
+
+    # lib2fas can only generate SHA1 codes:
+    with pytest.raises(ValueError, match="SHA256"):
+        parse_otpauth("otpauth://totp/X:a?secret=JBSWY3DPEHPK3PXP&digits=8&period=60&algorithm=SHA256")
+
+
+def test_imported_codes(tmp_path):
+    vault = Vault.create(str(tmp_path / "new.2fas"), None)
+    import_services(vault, ["otpauth://totp/X:a?secret=JBSWY3DPEHPK3PXP&digits=8&period=60\n"])
+    service = vault.lookup("X")[0]
+
+    expected = pyotp.TOTP("JBSWY3DPEHPK3PXP", digits=8, interval=60)
+    assert PrecomputedTotp.from_service(service).at(1_700_000_000) == expected.at(1_700_000_000)
+    assert vault.totp(service).at(1_700_000_000) == expected.at(1_700_000_000)
+
+
+def test_parse_csv_row():
+    entry = parse_csv_row({"issuer": "Example", "username": "bob", "secret": "JBSWY3DPEHPK3PXP", "other": "x"})
+    assert entry["name"] == "Example"
+    assert entry["otp"]["account"] == "bob"
+
+
+def test_parse_lines():
+    uris = [
+        "# exported from somewhere\n",
+        "otpauth://totp/A:a?secret=JBSWY3DPEHPK3PXP\n",
+        "\n",
+        "otpauth://hotp/B:b?secret=JBSWY3DPEHPK3PXP&counter=1\n",
+        "otpauth://totp/C:c?secret=NOT-BASE32\n",
+        "otpauth://totp/D:d?secret=JBSWY3DPEHPK3PXP&algorithm=MD5\n",
+    ]
+    parsed = list(parse_lines(["otpauth://totp/X:x?secret=JBSWY3DPEHPK3PXP\n", *uris]))
+    assert [(_.line, bool(_.entry)) for _ in parsed] == [(1, True), (3, True), (5, False), (6, False), (7, False)]
+    assert "secret" in parsed[3].error
+    assert "NOT-BASE32" not in parsed[3].error
+
+    csv_lines = io.StringIO("Name, Account ,Secret\nExample,bob,JBSWY3DPEHPK3PXP\n,,\n")
+    parsed = list(parse_lines(csv_lines))
+    assert parsed[0].entry["otp"]["account"] == "bob"
+    assert parsed[1].error == "missing secret"
+
+    assert next(parse_lines(["just some text\n"])).error
+
+    # the format is decided by the first line with content:
+    parsed = list(parse_lines(uris))
+    assert [(_.line, bool(_.entry)) for _ in parsed] == [(2, True), (4, False), (5, False), (6, False)]
+    parsed = list(parse_lines(["# exported\n", "\n", "name,secret\n", "A,JBSWY3DPEHPK3PXP\n", "B,\n"]))
+    assert [(_.line, bool(_.entry)) for _ in parsed] == [(4, True), (5, False)]
+    assert not list(parse_lines(["# nothing here\n", "\n"]))
+    assert not list(parse_lines([]))
+
+
+def test_import_services(tmp_path):
+    vault = load_vault(FILENAME_NOPASS)
+    existing = vault.storage["Example 2"][0]
+
+    result = import_services(
+        vault,
+        [
+            f"otpauth://totp/{existing.name}:{existing.otp.account}?secret={existing.secret}\n",
+            "otpauth://totp/New:alice?secret=JBSWY3DPEHPK3PXP\n",
+            "otpauth://totp/New:alice?secret=JBSWY3DPEHPK3PXP\n",
+            "otpauth://totp/Other:alice?secret=invalid!\n",
+        ],
+    )
+    assert [_.name for _ in result.added] == ["New"]
+    assert result.duplicates == 2
+    assert [line for line, _ in result.errors] == [4]
+
+    # name index is up to date:
+    assert vault.storage["New"][0].generate()
+    assert len(vault.storage) == 5
+
+    new = Vault.create(str(tmp_path / "new.2fas"), None)
+    result = import_services(new, ["name,secret\n", "A,JBSWY3DPEHPK3PXP\n", "B,JBSWY3DPEHPK3PXQ\n"])
+    new.save()
+    assert [_.name for _ in load_vault(str(tmp_path / "new.2fas")).storage] == ["A", "B"]
@@ -0,0 +1,107 @@
+import binascii
+import hashlib
+
+import pyotp
+import pytest
+from lib2fas import load_services
+
+from src.twofas.otp import PrecomputedTotp, codes_between, decode_secret, whois
+
+from ._shared import CWD
+
+
+def test_same_as_pyotp():
+    for secret in ("JBSWY3DPEHPK3PXP", pyotp.random_base32(), "jbsw y3dp ehpk 3pxq"):
+        totp = pyotp.TOTP(secret.replace(" ", ""))
+        fast = PrecomputedTotp(totp.byte_secret())
+
+        for timestamp in range(0, 1_800_000_000, 123_456_789):
+            assert fast.at(timestamp) == totp.at(timestamp)
+
+
+def test_parameters():
+    totp = pyotp.TOTP(pyotp.random_base32(), digits=8, interval=60, digest=hashlib.sha256)
+    fast = PrecomputedTotp(totp.byte_secret(), digits=8, interval=60, digest=hashlib.sha256)
+
+    assert fast.counter(119) == 1
+    assert fast.at(1_700_000_000) == totp.at(1_700_000_000)
+    assert len(fast.now()) == 8
+
+
+def test_from_service():
+    for service in load_services(CWD / "2fas-demo-nopass.2fas"):
+        fast = PrecomputedTotp.from_service(service)
+        assert fast.now() == service.generate()
+
+        counter = fast.counter(1_700_000_000)
+        assert fast.at_counter(counter, fast.keyed()) == service.totp.at(1_700_000_000)
+
+
+def test_whois():
+    services = list(load_services(CWD / "2fas-demo-nopass.2fas"))
+    totps = [(service, PrecomputedTotp.from_service(service)) for service in services]
+    timestamp = 1_700_000_000
+
+    target = services[2]
+    current = target.totp.at(timestamp)
+    assert (target, 0) in whois(totps, current, timestamp)
+    assert (target, 0) in whois(totps, current[:3] + " " + current[3:], timestamp)
+
+    previous = target.totp.at(timestamp - 30)
+    assert (target, -1) in whois(totps, previous, timestamp)
+    assert (target, -1) not in whois(totps, previous, timestamp, window=0)
+    assert (target, 2) in whois(totps, target.totp.at(timestamp + 60), timestamp, window=2)
+
+    assert whois(totps, "abcdef", timestamp) == []
+    assert whois(totps, current + "0", timestamp) == []
+    # no negative counters around the epoch:
+    assert (target, 0) in whois(totps, target.totp.at(0), 0)
+
+
+def test_decode_secret():
+    for secret in ("JBSWY3DPEHPK3PXP", "jbswy3dpehpk3pxp", "JBSWY3DPEHPK3PXPAB", pyotp.random_base32(64)):
+        assert decode_secret(secret) == pyotp.TOTP(secret).byte_secret()
+
+    for invalid in ("JBSWY3DPEHPK3PX8", "JBSW Y3DP", "JBSWY3DPE"):
+        with pytest.raises(binascii.Error):
+            decode_secret(invalid)
+
+
+def test_long_key():
+    # keys longer than the block size are hashed first (RFC 2104):
+    totp = pyotp.TOTP(pyotp.random_base32(128))
+    assert PrecomputedTotp(totp.byte_secret()).at(1_700_000_000) == totp.at(1_700_000_000)
+
+
+def test_codes_between():
+    services = list(load_services(CWD / "2fas-demo-nopass.2fas"))
+    totps = [(service, PrecomputedTotp.from_service(service)) for service in services]
+
+    rows = list(codes_between(totps, 1_700_000_000, 1_700_000_100))
+    # 1_699_999_980 up to and including 1_700_000_100: 5 windows
+    assert len(rows) == 5 * len(services)
+    assert rows[0][0] == 1_699_999_980
+    assert [row[1] for row in rows[: len(services)]] == services
+    for timestamp, service, code in rows:
+        assert service.totp.at(timestamp) == code
+
+    # lazy, so huge ranges are fine as long as they are consumed as a stream:
+    stream = codes_between(totps, 0, 1_000_000_000_000)
+    assert next(stream) == (0, services[0], services[0].totp.at(0))
+
+
+def test_codes_between_intervals():
+    slow = PrecomputedTotp(b"12345678901234567890", interval=60, digits=8)
+    fast = PrecomputedTotp(b"12345678901234567890", digits=8)
+
+    rows = list(codes_between([("slow", slow), ("fast", fast)], 0, 119))
+    assert [(timestamp, name) for timestamp, name, _ in rows] == [
+        (0, "slow"),
+        (0, "fast"),
+        (30, "fast"),
+        (60, "slow"),
+        (60, "fast"),
+        (90, "fast"),
+    ]
+    # RFC 6238 test vector (sha1, 30 seconds, T = 59):
+    assert rows[2][2] == "94287082"
@@ -0,0 +1,108 @@
+import time
+
+from src.twofas import query_cache
+from src.twofas.query_cache import HALF_LIFE, QueryCache, frecency
+from src.twofas.vault import _discard, load_vault
+
+from ._shared import CWD
+
+FILENAME_NOPASS = str(CWD / "2fas-demo-nopass.2fas")
+VERSION = [1, 2, 3, 4]
+
+
+def test_frecency():
+    now = time.time()
+    assert frecency({"count": 4, "last": now}, now) == 4
+    assert frecency({"count": 4, "last": now - HALF_LIFE}, now) == 2
+    # recently used once beats used often long ago:
+    assert frecency({"count": 1, "last": now}, now) > frecency({"count": 4, "last": now - 3 * HALF_LIFE}, now)
+
+
+def test_resolve_and_store(tmp_path):
+    storage = load_vault(FILENAME_NOPASS).storage
+    cache = QueryCache.load(tmp_path / "queries.json")
+
+    assert cache.resolve("demo", "exmple", storage, VERSION) is None
+    results = list(storage.find("exmple"))
+    assert cache.store("demo", "exmple", results, VERSION) == results
+    cache.save()
+
+    reloaded = QueryCache.load(tmp_path / "queries.json")
+    assert "secret" not in (tmp_path / "queries.json").read_text().lower()
+    assert reloaded.resolve("demo", "EXMPLE ", storage, VERSION) == results
+    # scopes (files, groups) don't mix:
+    assert reloaded.resolve("other", "exmple", storage, VERSION) is None
+    # and the file changed, so search again:
+    assert reloaded.resolve("demo", "exmple", storage, [1, 2, 3, 5]) is None
+
+
+def test_changed_vault(tmp_path):
+    vault = load_vault(FILENAME_NOPASS)
+    cache = QueryCache(path=tmp_path / "queries.json")
+    cache.store("demo", "example 3", list(vault.storage.find("example 3")), [len(vault.storage)])
+
+    # a new account for the same service must show up:
+    vault.edit(add=[{"name": "Example 3", "secret": "JBSWY3DPEHPK3PXP", "updatedAt": 0, "otp": {"account": "new"}}])
+    version = [len(vault.storage)]
+    assert cache.resolve("demo", "example 3", vault.storage, version) is None
+    assert len(cache.store("demo", "example 3", list(vault.storage.find("example 3")), version)) == 2
+    assert len(cache.resolve("demo", "example 3", vault.storage, version)) == 2
+
+
+def test_stale(tmp_path):
+    storage = load_vault(FILENAME_NOPASS).storage
+    cache = QueryCache(path=tmp_path / "queries.json")
+    cache.store("demo", "ex", list(storage.find("Example 3")), VERSION)
+
+    # removed without a new version (e.g. edited within the same second on a coarse filesystem):
+    _discard(storage, storage.find("Example 3"))
+    assert cache.resolve("demo", "ex", storage, VERSION) is None
+    assert not cache.queries
+    assert "example 3" not in storage._multidict  # resolve must not add keys to the defaultdict
+
+
+def test_picks(tmp_path):
+    storage = load_vault(FILENAME_NOPASS).storage
+    cache = QueryCache(path=tmp_path / "queries.json")
+
+    example_1 = list(storage.find("Example 1"))
+    assert len(example_1) == 2
+    cache.store("demo", "ex1", example_1, VERSION)
+
+    # the second account is the usual pick (wherever it was picked):
+    cache.record("demo", example_1[1:])
+    assert cache.resolve("demo", "ex1", storage, VERSION) == [example_1[1], example_1[0]]
+    assert cache.store("demo", "example 1", example_1, VERSION) == [example_1[1], example_1[0]]
+    assert cache.rank("other", example_1) == example_1
+
+
+def test_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_cache, "MAX_QUERIES", 2)
+    monkeypatch.setattr(query_cache, "MAX_SERVICES_PER_QUERY", 1)
+    monkeypatch.setattr(query_cache, "MAX_PICKS", 1)
+    storage = load_vault(FILENAME_NOPASS).storage
+    cache = QueryCache(path=tmp_path / "queries.json")
+
+    # too many results to cache, but all of them are returned:
+    assert len(cache.store("demo", "example", list(storage.find("example")), VERSION)) == 4
+    assert not cache.queries
+
+    for query in ("example 2", "example 3", "example 2 again"):
+        cache.store("demo", query, list(storage.find("example 2")), VERSION)
+        time.sleep(0.001)
+    assert cache.key("demo", "example 2") not in cache.queries  # least recently used
+    assert len(cache.queries) == 2
+
+    now = time.time()
+    cache.record("demo", storage.find("example 2"), now - HALF_LIFE)
+    cache.record("demo", storage.find("example 3"), now)
+    assert list(cache.picks) == [cache.pick_key("demo", storage["example 3"][0])]
+
+
+def test_broken_file(tmp_path):
+    path = tmp_path / "queries.json"
+    path.write_text("{")
+    assert not QueryCache.load(path).queries
+    path.write_text("[]")
+    assert not QueryCache.load(path).picks
+    assert not QueryCache.load(tmp_path / "missing.json").queries
@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+from lib2fas import load_services
+
+from src.twofas.shared import SharedStorage
+
+from ._shared import CWD
+
+
+@pytest.fixture(scope="module")
+def shared():
+    return SharedStorage.load(CWD / "2fas-demo-pass.2fas", passphrase="test")
+
+
+def test_load(shared):
+    assert shared
+    assert len(shared) == 4
+    assert "4 entries" in repr(shared)
+
+    assert SharedStorage.load("/tmp/2fas-does-not-exist.2fas") is None
+    assert not SharedStorage([])
+
+
+def test_read_only(shared):
+    with pytest.raises(AttributeError):
+        shared._services = ()
+
+    with pytest.raises(AttributeError):
+        del shared._services
+
+    # unlike TwoFactorStorage, a missing key is not added:
+    assert shared["missing"] == ()
+    assert "missing" not in shared
+    assert "EXAMPLE 1" in shared
+    assert next(iter(shared)) not in shared  # only names, not services
+
+
+def test_find_like_storage(shared):
+    storage = load_services(CWD / "2fas-demo-pass.2fas", passphrase="test")
+
+    for query in ("example 1", "Example", "exampel 2", "Additional", "google", "", "nothing-like-this"):
+        assert [_.secret for _ in shared.find(query)] == [_.secret for _ in storage.find(query)]
+
+    assert len(shared["EXAMPLE 1"]) == 2
+
+
+def test_generate(shared):
+    assert shared.generate_all(1_700_000_000) == [(_.name, _.totp.at(1_700_000_000)) for _ in shared]
+
+    service = next(iter(shared))
+    assert shared.generate(service) == service.generate()
+
+
+def test_generate_threads(shared):
+    expected = shared.generate_all(1_700_000_000)
+    results = []
+
+    def worker():
+        for _ in range(100):
+            results.append(shared.generate_all(1_700_000_000))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 400
+    assert all(result == expected for result in results)
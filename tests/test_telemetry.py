@@ -0,0 +1,103 @@
+import json
+import time
+
+from src.twofas import telemetry as telemetry_module
+from src.twofas.telemetry import Telemetry, aggregate, percentile, read_records
+from src.twofas.vault import load_vault
+
+from ._shared import CWD
+
+
+def test_disabled(tmp_path):
+    telemetry = Telemetry(tmp_path / "telemetry.jsonl")
+    telemetry.start("generate", enabled=False)
+    with telemetry.phase("load"):
+        pass
+
+    telemetry.flush()
+    assert not telemetry.phases
+    assert not (tmp_path / "telemetry.jsonl").exists()
+
+
+def test_record(tmp_path, monkeypatch):
+    path = tmp_path / "telemetry.jsonl"
+    telemetry = Telemetry(path)
+    monkeypatch.setattr(telemetry_module, "telemetry", telemetry)
+    monkeypatch.setattr("src.twofas.vault.telemetry", telemetry)
+
+    telemetry.start("generate")
+    vault = load_vault(str(CWD / "2fas-demo-nopass.2fas"))
+    with telemetry.phase("find"):
+        services = list(vault.storage.find("Example 2"))
+    with telemetry.phase("generate"):
+        services[0].generate()
+    with telemetry.phase("generate"):
+        pass
+
+    telemetry.flush()
+    telemetry.flush()  # only written once
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 1
+    record = json.loads(lines[0])
+    assert record["command"] == "generate"
+    assert record["vault_size"] == 4
+    # an unencrypted file is parsed, not decrypted:
+    assert set(record["phases"]) == {"load", "parse", "find", "generate"}
+    assert record["total"] >= sum(record["phases"].values())
+    # no service names or secrets:
+    assert "example" not in lines[0].lower()
+    assert services[0].secret not in lines[0]
+
+
+def test_rotate(tmp_path, monkeypatch):
+    path = tmp_path / "telemetry.jsonl"
+    monkeypatch.setattr(telemetry_module, "MAX_BYTES", 600)
+
+    for idx in range(10):
+        telemetry = Telemetry(path)
+        telemetry.start(f"command-{idx}")
+        telemetry.flush()
+
+    assert path.stat().st_size <= 600
+    assert (tmp_path / "telemetry.jsonl.1").exists()
+
+    commands = [record["command"] for record in read_records(path)]
+    # oldest records were rotated out, the rest is in order:
+    assert commands[-1] == "command-9"
+    assert commands == sorted(commands)
+    assert len(commands) < 10
+
+
+def test_aggregate():
+    assert percentile([1.0], 95) == 1.0
+    assert percentile([float(_) for _ in range(1, 101)], 95) == 95.0
+    assert percentile([1.0, 2.0], 50) == 1.0
+
+    records = [
+        {"command": "generate", "total": idx / 100, "vault_size": idx, "phases": {"load": 0.01}} for idx in range(100)
+    ]
+    records.append({"command": "all", "total": 1.0, "phases": {}})
+
+    stats = aggregate(records)
+    assert list(stats) == ["all", "generate"]
+    assert stats["generate"]["count"] == 100
+    assert stats["generate"]["vault_size"] == 99
+    assert stats["generate"]["total"][50] == 0.49
+    assert stats["generate"]["load"][99] == 0.01
+    assert "load" not in stats["all"]
+
+
+def test_wait(tmp_path):
+    telemetry = Telemetry(tmp_path / "telemetry.jsonl")
+    telemetry.start("interactive")
+    with telemetry.phase("find"):
+        pass
+    with telemetry.wait():  # e.g. a prompt
+        time.sleep(0.05)
+
+    record = telemetry.record()
+    assert record["wait"] >= 0.05
+    assert record["total"] < 0.05
+    assert set(record["phases"]) == {"find"}
+    assert "wait" not in aggregate([record])["interactive"]
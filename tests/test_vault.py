@@ -0,0 +1,287 @@
+import base64
+import json
+import os
+import shutil
+from typing import Optional
+
+import pytest
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from lib2fas import KeyringManagerProtocol, derive_key, extract_salt, split_encrypted
+
+from src.twofas.vault import (
+    REFERENCE,
+    PendingServices,
+    Vault,
+    decrypt_entries,
+    load_services_in_background,
+    load_vault,
+    read_vault_file,
+    stat_signature,
+)
+
+from ._shared import CWD
+
+FILENAME_PASS = str(CWD / "2fas-demo-pass.2fas")
+FILENAME_NOPASS = str(CWD / "2fas-demo-nopass.2fas")
+
+
+class FakeKeyringManager(KeyringManagerProtocol):
+    """
+    In-memory keyring which 'asks' the user by popping from a list of answers.
+    """
+
+    def __init__(self, *answers: str) -> None:
+        self.stored: dict[str, str] = {}
+        self.answers = list(answers)
+        self.asked = 0
+
+    def retrieve_credentials(self, filename: str) -> Optional[str]:
+        return self.stored.get(filename)
+
+    def save_credentials(self, filename: str) -> str:
+        self.asked += 1
+        self.stored[filename] = self.answers.pop(0)
+        return self.stored[filename]
+
+    def delete_credentials(self, filename: str) -> None:
+        self.stored.pop(filename, None)
+
+    def cleanup_keyring(self) -> int:
+        return 0
+
+
+def encrypt(entries: list[dict], passphrase: str, salt: bytes) -> str:
+    nonce = os.urandom(12)
+    encrypted = AESGCM(derive_key(passphrase, salt)).encrypt(nonce, json.dumps(entries).encode(), None)
+    return ":".join(base64.b64encode(_).decode() for _ in (encrypted, salt, nonce))
+
+
+def write_version(path, data: dict) -> None:
+    path.write_text(json.dumps(data))
+    # make sure the change is noticed, even if the mtime resolution is low:
+    os.utime(path, ns=(0, stat_signature(path)[2] + 1_000_000_000))
+
+
+@pytest.fixture
+def plain_copy(tmp_path):
+    path = tmp_path / "plain.2fas"
+    shutil.copy(FILENAME_NOPASS, path)
+    return path
+
+
+def test_read_vault_file():
+    assert read_vault_file("/tmp/2fas-does-not-exist.2fas") is None
+    assert stat_signature("/tmp/2fas-does-not-exist.2fas") is None
+
+    data = read_vault_file(FILENAME_PASS)
+    assert data["servicesEncrypted"]
+    assert not data["services"]
+
+
+def test_decrypt_entries():
+    encrypted = read_vault_file(FILENAME_PASS)["servicesEncrypted"]
+    vault = Vault.unlock(FILENAME_PASS, read_vault_file(FILENAME_PASS), "test")
+
+    assert len(decrypt_entries(encrypted, vault._key)) == 4
+
+    with pytest.raises(PermissionError):
+        decrypt_entries(encrypted, b"0" * 32)
+
+
+def test_background_encrypted():
+    manager = FakeKeyringManager("test")
+    pending = load_services_in_background(FILENAME_PASS, manager)
+
+    # passphrase is asked before the background work starts:
+    assert manager.asked == 1
+    assert not pending.failed()
+
+    vault = pending.result()
+    assert pending.done()
+    assert not pending.failed()
+    assert len(vault.storage) == 4
+    assert "4 entries" in repr(vault)
+
+
+def test_background_wrong_passphrase():
+    manager = FakeKeyringManager("wrong", "test")
+    pending = load_services_in_background(FILENAME_PASS, manager)
+
+    vault = pending.result()
+    # the wrong passphrase is removed from the keyring and the user is asked again:
+    assert manager.asked == 2
+    assert manager.stored[FILENAME_PASS] == "test"
+    assert len(vault.storage) == 4
+
+    # result is cached:
+    assert pending.result() is vault
+
+
+def test_background_without_decryption():
+    manager = FakeKeyringManager()
+
+    pending = load_services_in_background(FILENAME_NOPASS, manager)
+    assert pending.done()
+    assert len(pending.result().storage) == 4
+
+    pending = load_services_in_background("/tmp/2fas-does-not-exist.2fas", manager)
+    assert pending.failed()
+    assert pending.result() is None
+
+    assert manager.asked == 0
+
+
+def test_resolved():
+    pending = PendingServices.resolved("-", None)
+    assert pending.done()
+    assert pending.failed()
+
+
+def test_load_vault():
+    assert load_vault("/tmp/2fas-does-not-exist.2fas") is None
+
+    manager = FakeKeyringManager("wrong", "test")
+    vault = load_vault(FILENAME_PASS, manager)
+    assert manager.asked == 2
+    assert len(vault.storage) == 4
+    assert not vault.changed()
+    assert vault.refresh() is None
+
+
+def test_load_broken(plain_copy):
+    # unlike a reload, the first load must not turn a broken file into an empty vault:
+    plain_copy.write_bytes(plain_copy.read_bytes()[:100])
+    with pytest.raises(ValueError):
+        load_vault(str(plain_copy))
+
+
+def test_reload_plain(plain_copy):
+    vault = load_vault(str(plain_copy))
+    data = read_vault_file(plain_copy)
+
+    unchanged = vault.storage["Example 2"][0]
+    totp = vault.totp(unchanged)
+    assert vault.totp(unchanged) is totp
+    removed = vault.storage["Example 3"][0]
+    vault.totp(removed)
+
+    services = data["services"]
+    services[1]["secret"] = "ABCDABCDABCDABCD"  # Example 1 (second account): changed
+    services.pop(3)  # Example 3: removed
+    services.append({"name": "Example 4", "secret": "JBSWY3DPEHPK3PXX", "updatedAt": 0})  # added
+    write_version(plain_copy, data)
+
+    assert vault.changed()
+    changes = vault.refresh()
+    assert [_.name for _ in changes.added] == ["Example 4"]
+    assert [_.name for _ in changes.removed] == ["Example 3"]
+    assert [(a.secret, b.secret) for a, b in changes.changed] == [("JBSWY3DPEHPK3PXP", "ABCDABCDABCDABCD")]
+
+    assert len(vault.storage) == 4
+    assert vault.storage.keys() == ["example 1", "example 2", "example 4"]
+    # unchanged services (and their precomputed state) are kept:
+    assert vault.storage["Example 2"][0] is unchanged
+    assert vault.totp(unchanged) is totp
+    assert id(removed) not in vault._totps
+
+    assert vault.refresh() is None
+
+    # file partially written or temporarily gone (e.g. while syncing):
+    plain_copy.write_text('{"services": [')
+    assert not vault.reload()
+    assert vault.changed()
+
+    plain_copy.unlink()
+    assert vault.changed()
+    assert not vault.reload()
+    assert len(vault.storage) == 4
+
+
+def test_reload_encrypted(tmp_path):
+    path = tmp_path / "encrypted.2fas"
+    shutil.copy(FILENAME_PASS, path)
+
+    manager = FakeKeyringManager("test")
+    vault = load_vault(str(path), manager)
+    entries = decrypt_entries(read_vault_file(path)["servicesEncrypted"], vault._key)
+
+    # same salt: the key is reused, no passphrase needed
+    entries[0]["icon"]["label"]["text"] = "XX"
+    write_version(path, {"services": [], "servicesEncrypted": encrypt(entries, "test", vault._salt)})
+    manager.stored.clear()
+
+    changes = vault.refresh()
+    assert not changes.added and not changes.removed
+    assert [(a.name, b.name) for a, b in changes.changed] == [("Example 1", "Example 1")]
+    assert manager.asked == 1
+
+    # new salt (re-exported with another passphrase): ask again
+    manager.answers = ["test", "other"]
+    write_version(path, {"services": [], "servicesEncrypted": encrypt(entries[:2], "other", os.urandom(32))})
+
+    changes = vault.refresh()
+    assert manager.asked == 3
+    assert len(changes.removed) == 2
+    assert len(vault.storage) == 2
+
+    # decrypted export:
+    write_version(path, {"services": entries})
+    assert len(vault.refresh().added) == 2
+
+
+def test_edit_and_save(tmp_path):
+    path = tmp_path / "encrypted.2fas"
+    shutil.copy(FILENAME_PASS, path)
+    manager = FakeKeyringManager("test")
+    vault = load_vault(str(path), manager)
+    salt = vault._salt
+
+    removed = vault.storage["Example 3"][0]
+    entry = vault.entry(vault.storage["Example 2"][0])
+    entry["name"] = "Example 5"
+    added = vault.edit(remove=[removed], add=[entry])
+    assert [_.name for _ in added] == ["Example 5"]
+    assert vault.storage.keys() == ["example 1", "example 2", "example 5"]
+    assert len(vault.storage) == 4
+
+    vault.save()
+    # no KDF needed for saving and our own write doesn't trigger a reload:
+    assert manager.asked == 1
+    assert not vault.changed()
+
+    data = read_vault_file(path)
+    assert data["groups"] and data["reference"] and not data["services"]
+    assert extract_salt(data["servicesEncrypted"]) == salt
+    assert not list(tmp_path.glob(".*.tmp"))
+
+    reloaded = load_vault(str(path), FakeKeyringManager("test"))
+    assert sorted(reloaded.storage.keys()) == ["example 1", "example 2", "example 5"]
+    assert reloaded.storage["Example 5"][0].secret == vault.storage["Example 2"][0].secret
+
+
+def test_create(tmp_path):
+    path = tmp_path / "new.2fas"
+    vault = Vault.create(str(path), "secret")
+    vault.edit(add=[{"name": "New", "secret": "JBSWY3DPEHPK3PXP", "updatedAt": 0}])
+    vault.save()
+
+    data = read_vault_file(path)
+    key = derive_key("secret", extract_salt(data["servicesEncrypted"]))
+    ciphertext, _, nonce = split_encrypted(data["reference"])
+    # the 2fas apps check the passphrase with this:
+    assert AESGCM(key).decrypt(nonce, ciphertext, None).decode() == REFERENCE
+    assert len(load_vault(str(path), FakeKeyringManager("secret")).storage) == 1
+
+    plain = tmp_path / "plain.2fas"
+    vault = Vault.create(str(plain), "")
+    vault.save()
+    assert read_vault_file(plain)["services"] == []
+    # new files are only readable by the current user:
+    assert os.stat(plain).st_mode & 0o777 == 0o600
+
+
+def test_save_keeps_mode(plain_copy):
+    os.chmod(plain_copy, 0o640)
+    vault = load_vault(str(plain_copy))
+    vault.save()
+    assert os.stat(plain_copy).st_mode & 0o777 == 0o640